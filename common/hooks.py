@@ -0,0 +1,18 @@
+# Event binding of the observers of both simulator cores, see observer.py of
+# each simulator for its events.
+
+
+def bind(base, observers, event):
+    # The call of `event` on all observers which override the method of
+    # `base`, None if there are none
+    default = getattr(base, event)
+    calls = [getattr(obs, event) for obs in observers if getattr(type(obs), event) is not default]
+    if not calls:
+        return None
+    if len(calls) == 1:
+        return calls[0]
+
+    def fanout(*args):
+        for call in calls:
+            call(*args)
+    return fanout
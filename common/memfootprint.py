@@ -0,0 +1,96 @@
+import os
+import json
+import inspect
+import tracemalloc
+from collections import defaultdict
+
+# Memory footprint per subsystem, shared by both simulators. The subsystems
+# are given by the RULES of footprint.py of each simulator.
+
+# Frames kept per allocation, enough to get from helper modules and the
+# standard library back to the simulator code which asked for the memory
+TRACEBACK_FRAMES = 3
+
+
+class Footprint(object):
+    # Memory footprint of the simulator per subsystem, from tracemalloc
+    # snapshots taken at the phase boundaries of a run (load, run, dump).
+    # Every phase records the bytes still allocated per subsystem, and the
+    # peak of all traced memory during the phase. tracemalloc has no peak per
+    # subsystem, the peak of a subsystem is its largest retained size over
+    # the snapshots.
+    # `rules` are (class or function, subsystem) pairs: the memory allocated
+    # in the module of a class, or in a function, is charged to its subsystem,
+    # functions take precedence over the module they are in. Allocations of
+    # other modules are charged to the nearest caller listed.
+    def __init__(self, rules):
+        self.files = {}
+        self.spans = defaultdict(list)
+        for target, subsystem in rules:
+            filename = os.path.abspath(inspect.getsourcefile(target))
+            if inspect.isclass(target):
+                self.files.setdefault(filename, subsystem)
+            else:
+                lines, first = inspect.getsourcelines(target)
+                self.spans[filename].append((first, first + len(lines) - 1, subsystem))
+        # Subsystem of every (filename, lineno), resolved once
+        self.lines = {}
+        self.phases = []
+        tracemalloc.start(TRACEBACK_FRAMES)
+
+    def line_subsystem(self, filename, lineno):
+        key = (filename, lineno)
+        if key not in self.lines:
+            subsystem = None
+            for first, last, sub in self.spans.get(filename, ()):
+                if first <= lineno <= last:
+                    subsystem = sub
+                    break
+            self.lines[key] = subsystem or self.files.get(filename)
+        return self.lines[key]
+
+    def subsystem(self, traceback):
+        # Innermost frame of a listed module or function
+        for frame in reversed(traceback):
+            subsystem = self.line_subsystem(frame.filename, frame.lineno)
+            if subsystem is not None:
+                return subsystem
+        return "other"
+
+    def phase(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        retained = defaultdict(int)
+        for stat in tracemalloc.take_snapshot().statistics("traceback"):
+            retained[self.subsystem(stat.traceback)] += stat.size
+        self.phases.append({
+            "phase": name,
+            "current": current,
+            "peak": peak,
+            "retained": dict(sorted(retained.items(), key=lambda kv: -kv[1])),
+        })
+        tracemalloc.reset_peak()
+
+    def subsystems(self):
+        peaks = defaultdict(int)
+        for phase in self.phases:
+            for subsystem, size in phase["retained"].items():
+                peaks[subsystem] = max(peaks[subsystem], size)
+        return dict(sorted(peaks.items(), key=lambda kv: -kv[1]))
+
+    def dump(self, iodir):
+        tracemalloc.stop()
+        filepath = os.path.abspath(os.path.join(iodir, "footprint.json"))
+        with open(filepath, "w") as ff:
+            json.dump({"phases": self.phases, "peak": self.subsystems()}, ff, indent=2)
+        print("Footprint - Memory footprint written to file:", filepath)
+
+    def report(self):
+        lines = []
+        for phase in self.phases:
+            lines.append(
+                f"Footprint - {phase['phase']}: retained {phase['current'] / 2**20:.1f} MiB, "
+                f"peak {phase['peak'] / 2**20:.1f} MiB"
+            )
+        for subsystem, size in self.subsystems().items():
+            lines.append(f"Footprint -   {subsystem:<16} {size / 2**20:>8.1f} MiB")
+        return "\n".join(lines)
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import resource
+
+# Progress telemetry shared by the functional and timing simulators, see
+# progress.py of each simulator for what is reported and when.
+
+
+def rss_bytes():
+    # Resident set size of this process, peak RSS where /proc is not available
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Runaway(Exception):
+    # Raised by Progress to abort a run which makes no progress,
+    # the entry script reports it and exits with status 1
+    pass
+
+
+class MetricsFile(object):
+    # Metrics of the progress reports: Prometheus text format if the file
+    # name ends in .prom, else one JSON object per line. Prometheus metric
+    # names are the keys with `prefix`, e.g. vmips_timing_.
+    def __init__(self, filepath, prefix):
+        self.filepath = filepath
+        self.prefix = prefix
+        self.prom = filepath.endswith(".prom")
+        if not self.prom:
+            # New JSON lines file for this run
+            open(filepath, "w").close()
+
+    def write(self, metrics, final=False):
+        if self.prom:
+            # Textfile collectors read the whole file, so replace it atomically
+            tmppath = f"{self.filepath}.{os.getpid()}.tmp"
+            with open(tmppath, "w") as mf:
+                mf.write("".join(f"{self.prefix}{key} {val}\n" for key, val in metrics.items()))
+            os.replace(tmppath, self.filepath)
+        else:
+            with open(self.filepath, "a") as mf:
+                mf.write(json.dumps(dict(metrics, final=final)) + "\n")
@@ -0,0 +1,86 @@
+import os
+from collections import Counter
+
+from observer import Observer
+
+
+class AccessStats(object):
+    # Access statistics of one static vector load/store instruction
+    def __init__(self, ins, numbanks):
+        self.ins = ins
+        self.count = 0
+        self.elements = 0
+        self.strides = Counter()
+        self.bank_hist = [0] * numbanks
+        # Most elements of a single access on the same bank
+        self.max_bank_load = 0
+        # Longest run of consecutive elements of an access on the same bank
+        self.max_bank_run = 0
+        self.footprint = set()
+
+
+class AccessProfile(Observer):
+    # Profile of vector memory accesses, aggregated per static instruction (PC).
+    # Records the strides, bank distribution and touched VDMEM of every
+    # executed LV/LVWS/LVI/SV/SVWS/SVI, to find the accesses which
+    # serialize on the banks without running the timing model.
+    def __init__(self, numbanks):
+        self.numbanks = numbanks
+        self.stats = {}
+
+    def vector_access(self, core, ins, addrs):
+        self.record(core.PC, ins, addrs)
+
+    def record(self, pc, ins, addrs):
+        if pc not in self.stats:
+            self.stats[pc] = AccessStats(ins, self.numbanks)
+        st = self.stats[pc]
+        st.count += 1
+        st.elements += len(addrs)
+        st.footprint.update(addrs)
+
+        banks = [a % self.numbanks for a in addrs]
+        load = [0] * self.numbanks
+        run = 0
+        for i, bank in enumerate(banks):
+            load[bank] += 1
+            run = run + 1 if i > 0 and bank == banks[i - 1] else 1
+            st.max_bank_run = max(st.max_bank_run, run)
+            if i > 0:
+                st.strides[addrs[i] - addrs[i - 1]] += 1
+        for bank in range(self.numbanks):
+            st.bank_hist[bank] += load[bank]
+        st.max_bank_load = max(st.max_bank_load, max(load))
+
+    def dump(self, iodir):
+        opfilepath = os.path.abspath(os.path.join(iodir, "access_profile.txt"))
+        # Worst bank serialization first
+        order = sorted(self.stats.items(), key=lambda kv: (-kv[1].max_bank_load, kv[0]))
+        row_format = "{:<6}{:<24}{:>8}{:>10}  {:<24}{:>7}{:>9}{:>9}{:>11}  {}\n"
+        lines = [
+            f"Vector memory access profile, {self.numbanks} banks\n",
+            row_format.format(
+                "PC", "Instruction", "Count", "Elements", "Strides", "Banks", "MaxLoad", "MaxRun", "Footprint", "Range"
+            ),
+        ]
+        for pc, st in order:
+            ops = " ".join(str(o) for o in st.ins.ops)
+            strides = ",".join(f"{s}:{n}" for s, n in st.strides.most_common(3)) or "-"
+            lines.append(row_format.format(
+                pc,
+                f"{st.ins.opcode} {ops}",
+                st.count,
+                st.elements,
+                strides,
+                sum(1 for n in st.bank_hist if n > 0),
+                st.max_bank_load,
+                st.max_bank_run,
+                len(st.footprint),
+                f"{min(st.footprint)}-{max(st.footprint)}" if st.footprint else "-",
+            ))
+        lines.append("\nBank distribution (elements per bank)\n")
+        for pc, st in order:
+            lines.append(f"{pc:<6}" + " ".join(str(n) for n in st.bank_hist) + "\n")
+        with open(opfilepath, "w") as opf:
+            opf.write("".join(lines))
+        print("AccessProfile - Dumped profile into output file in path:", opfilepath)
@@ -0,0 +1,29 @@
+import os
+
+# Architecture parameters of the functional simulator, read from Config.txt.
+# The defaults are the original VMIPS design.
+DEFAULTS = {
+    "maxVectorLength": 64,
+    "numScalarRegs": 8,
+    "numVectorRegs": 8,
+    "sdmemAddrBits": 13,  # 32 KB is 2^15 bytes = 2^13 K 32-bit words.
+    "vdmemAddrBits": 17,  # 512 KB is 2^19 bytes = 2^17 K 32-bit words.
+}
+
+
+def read_config(iodir):
+    # All integer parameters of Config.txt if present, over the defaults.
+    # The timing parameters are kept too, e.g. vdmNumBanks for the access profile.
+    params = dict(DEFAULTS)
+    filepath = os.path.join(iodir, "Config.txt")
+    if not os.path.isfile(filepath):
+        return params
+    with open(filepath, "r") as conf:
+        for line in conf:
+            if "#" in line:
+                line = line[: line.index("#")]
+            if "=" not in line:
+                continue
+            key, val = line.split("=")
+            params[key.strip()] = int(val)
+    return params
@@ -1,7 +1,9 @@
 import os
+import operator
 
 from regfile import RegisterFile, Reg
 from bitvec import BitVec
+from observer import hook
 
 
 class executor:
@@ -24,23 +26,37 @@ class executor:
         return cls.EXEC_FUNC[opcode]
 
 
+# Element operation of the vector arithmetic and mask instructions, by opcode prefix
+VECTOR_OPS = {"ADD": BitVec.add, "SUB": BitVec.sub, "MUL": BitVec.mul, "DIV": BitVec.div}
+MASK_OPS = {
+    "SEQ": operator.eq, "SNE": operator.ne, "SGT": operator.gt,
+    "SLT": operator.lt, "SGE": operator.ge, "SLE": operator.le,
+}
+
+
 class Core:
-    MVL = 64  # Max vector length
+    MVL = 64  # Default max vector length
 
-    def __init__(self, imem, sdmem, vdmem, trace=False):
+    def __init__(
+        self, imem, sdmem, vdmem, trace=False, access_profile=None,
+        mvl=MVL, num_sregs=8, num_vregs=8, progress=None, snapshots=None, observers=(),
+    ):
         self.IMEM = imem
         self.SDMEM = sdmem
         self.VDMEM = vdmem
+        self.MVL = mvl  # Max vector length
 
-        self.SRF = RegisterFile(Reg.SCALAR, 8)
-        self.VRF = RegisterFile(Reg.VECTOR, 8, Core.MVL)
+        self.SRF = RegisterFile(Reg.SCALAR, num_sregs)
+        self.VRF = RegisterFile(Reg.VECTOR, num_vregs, self.MVL)
 
         # Initialize special registers
         self.PC = 0
-        self.VL = Core.MVL # Vector Length
-        self.VM = [1 for i in range(Core.MVL)] # Vector Mask 0/1
+        self.VL = self.MVL # Vector Length
+        self.VM = [1] * self.MVL # Vector Mask 0/1
 
         self.halted = False
+        # Dynamic instruction count, not 0 when resumed from a snapshot
+        self.count = 0
         # For branching
         self.branch_taken = False
         self.branch_PC = 0
@@ -50,22 +66,40 @@ class Core:
             self.trace = []
         else:
             self.trace = None
+        # Trace lines of the instructions before a resumed snapshot
+        self.trace_prefix = []
+        # Vector memory access profile, progress reporting and state
+        # snapshots for incremental runs are observers like any other
+        self.observers = [obs for obs in (access_profile, progress, snapshots) if obs is not None]
+        self.observers.extend(observers)
+        self.on_step = hook(self.observers, "step")
+        self.on_retire = hook(self.observers, "retire")
+        self.on_vector_access = hook(self.observers, "vector_access")
+        self.on_scalar_access = hook(self.observers, "scalar_access")
+        self.on_finish = hook(self.observers, "finish")
+
+    def run(self, stop=-1):
+        # Run until HALT, or until `stop` instructions are executed
+        count = self.count # Dynamic instruction count
+        on_step = self.on_step
+        on_retire = self.on_retire
+        while not self.halted and count != stop:
+            if on_step is not None:
+                on_step(self, count)
 
-    def run(self):
-        count = 0 # Dynamic instruction count
-        while not self.halted:
             # Set to false here, if branch is taken, execution will set to True
             self.branch_taken = False
 
             # Read instruction from memory
             ins = self.IMEM.Read(self.PC)
             if self.trace is not None:
-                self.trace.append([ins, None])
-            # print(f"INS {count:>5}: {self.PC:<8} {ins}")
+                self.trace.append([self.PC, ins, None])
             # Lookup executor based on opcode
             ex = executor.get(ins.opcode)
             # Execute the instruction
             ex(self, ins)
+            if on_retire is not None:
+                on_retire(self, ins)
 
             # Update PC to branch target or PC+1
             if self.branch_taken:
@@ -75,10 +109,14 @@ class Core:
 
             count += 1 # Increment dynamic count
 
+        self.count = count
+        if self.halted and self.on_finish is not None:
+            self.on_finish(self, count)
+
     # Append runtime value to trace
     def trace_value(self, value):
         if self.trace is not None:
-            self.trace[-1][1] = value
+            self.trace[-1][2] = value
 
     @executor("ADD", "SUB", "AND", "OR", "XOR", "SLL", "SRL", "SRA")
     def exec_arithmetic_scalar(self, ins):
@@ -110,22 +148,16 @@ class Core:
         # Vector-Vector arithmetic instructions
         veca = self.VRF.Read(ins.src(0))
         vecb = self.VRF.Read(ins.src(1))
-        res = [None]*Core.MVL
+        if ins.opcode not in {"ADDVV", "SUBVV", "MULVV", "DIVVV"}:
+            raise NotImplementedError(f"Opcode not supported in exec_arith_vv: {ins.opcode}")
+        op = VECTOR_OPS[ins.opcode[:3]]
+        # Only the first VL elements are written, so only they are computed
+        vm = self.VM
+        res = [None] * self.VL
         for i in range(self.VL):
             # Check vector mask
-            if not self.VM[i]:
-                continue
-
-            if ins.opcode == "ADDVV":
-                res[i] = BitVec.add(veca[i], vecb[i])
-            elif ins.opcode == "SUBVV":
-                res[i] = BitVec.sub(veca[i], vecb[i])
-            elif ins.opcode == "MULVV":
-                res[i] = BitVec.mul(veca[i], vecb[i])
-            elif ins.opcode == "DIVVV":
-                res[i] = BitVec.div(veca[i], vecb[i])
-            else:
-                raise NotImplementedError(f"Opcode not supported in exec_arith_vv: {ins.opcode}")
+            if vm[i]:
+                res[i] = op(veca[i], vecb[i])
         self.trace_value(self.VL)
         self.VRF.Write(ins.dst(), res, self.VM, self.VL)
 
@@ -134,43 +166,37 @@ class Core:
         # Vector-Scalar arithmetic instructions
         veca = self.VRF.Read(ins.src(0))
         b = self.SRF.Read(ins.src(1))
-        res = [None] * Core.MVL
+        if ins.opcode not in {"ADDVS", "SUBVS", "MULVS", "DIVVS"}:
+            raise NotImplementedError(f"Opcode not supported in exec_arith_vv: {ins.opcode}")
+        op = VECTOR_OPS[ins.opcode[:3]]
+        vm = self.VM
+        res = [None] * self.VL
         for i in range(self.VL):
             # Check vector mask
-            if not self.VM[i]:
-                continue
-
-            if ins.opcode == "ADDVS":
-                res[i] = BitVec.add(veca[i], b)
-            elif ins.opcode == "SUBVS":
-                res[i] = BitVec.sub(veca[i], b)
-            elif ins.opcode == "MULVS":
-                res[i] = BitVec.mul(veca[i], b)
-            elif ins.opcode == "DIVVS":
-                res[i] = BitVec.div(veca[i], b)
-            else:
-                raise NotImplementedError(f"Opcode not supported in exec_arith_vv: {ins.opcode}")
+            if vm[i]:
+                res[i] = op(veca[i], b)
         self.trace_value(self.VL)
         self.VRF.Write(ins.dst(), res, mask=self.VM, length=self.VL)
 
     def get_mem_addresses(self, ins):
         # Generate addresses for vector load and store instructions
-        # based on type of access (direct, strided, scatter/gather)
+        # based on type of access (direct, strided, scatter/gather),
+        # only for the first VL elements
         start_addr = self.SRF.Read(ins.src(0)).unsigned()
         if ins.opcode[2:] == "WS":
             # Stride SR
             stride = self.SRF.Read(ins.src(1)).unsigned()
             if stride > 0:
-                addrs = list(range(start_addr, start_addr + Core.MVL*stride, stride))
+                addrs = list(range(start_addr, start_addr + self.VL*stride, stride))
             else:
-                addrs = [start_addr] * Core.MVL
+                addrs = [start_addr] * self.VL
         elif ins.opcode[2:] == "I":
             # Offsets taken from VR
             offsets = self.VRF.Read(ins.src(1))
-            addrs = [start_addr + s.unsigned() for s in offsets]
+            addrs = [start_addr + s.unsigned() for s in offsets[:self.VL]]
         else:
             # Stride 1
-            addrs = list(range(start_addr, start_addr + Core.MVL))
+            addrs = list(range(start_addr, start_addr + self.VL))
         # print(f"    Addresses: {addrs}")
         return addrs
 
@@ -178,13 +204,15 @@ class Core:
     def exec_load_vector(self, ins):
         # Load vector (with stride, gather)
         addrs = self.get_mem_addresses(ins)
-        res = [None] * Core.MVL
+        res = [None] * self.VL
         for i in range(self.VL):
             # Check vector mask
             if self.VM[i]:
                 res[i] = self.VDMEM.Read(addrs[i])
         self.VRF.Write(ins.dst(), res, mask=self.VM, length=self.VL)
-        self.trace_value(addrs[:self.VL])
+        self.trace_value(addrs)
+        if self.on_vector_access is not None:
+            self.on_vector_access(self, ins, addrs)
 
     @executor("SV", "SVWS", "SVI")
     def exec_store_vector(self, ins):
@@ -195,7 +223,9 @@ class Core:
             # Check vector mask
             if self.VM[i]:
                 self.VDMEM.Write(addrs[i], res[i])
-        self.trace_value(addrs[:self.VL])
+        self.trace_value(addrs)
+        if self.on_vector_access is not None:
+            self.on_vector_access(self, ins, addrs)
 
     @executor("BEQ", "BNE", "BGT", "BLT", "BGE", "BLE")
     def exec_branch(self, ins):
@@ -227,8 +257,7 @@ class Core:
     @executor("CVM")
     def exec_cvm(self, ins):
         # Clear vector mask
-        for i in range(Core.MVL):
-            self.VM[i] = 1
+        self.VM = [1] * self.MVL
 
     @executor("POP")
     def exec_pop(self, ins):
@@ -260,6 +289,8 @@ class Core:
         val = self.SDMEM.Read(addr)
         self.SRF.Write(ins.dst(), val)
         self.trace_value(addr)
+        if self.on_scalar_access is not None:
+            self.on_scalar_access(self, ins, addr)
 
     @executor("SS")
     def exec_store_scalar(self, ins):
@@ -268,72 +299,49 @@ class Core:
         val = self.SRF.Read(ins.dst())
         self.SDMEM.Write(addr, val)
         self.trace_value(addr)
+        if self.on_scalar_access is not None:
+            self.on_scalar_access(self, ins, addr)
         
     @executor("SEQVV", "SNEVV", "SGTVV", "SLTVV", "SGEVV", "SLEVV")
     def exec_svv(self, ins):
+        # Compare all MVL elements, regardless of VL
         veca = self.VRF.Read(ins.op(0))
         vecb = self.VRF.Read(ins.op(1))
-        if ins.opcode == "SEQVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() == vecb[i].signed() else 0
-        elif ins.opcode == "SNEVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() != vecb[i].signed() else 0
-        elif ins.opcode == "SGTVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() > vecb[i].signed() else 0
-        elif ins.opcode == "SLTVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() < vecb[i].signed() else 0
-        elif ins.opcode == "SGEVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() >= vecb[i].signed() else 0
-        elif ins.opcode == "SLEVV":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() <= vecb[i].signed() else 0
-        else:
+        if ins.opcode not in {"SEQVV", "SNEVV", "SGTVV", "SLTVV", "SGEVV", "SLEVV"}:
             raise NotImplementedError(f"Opcode not supported in exec_svv: {ins.opcode}")
+        cmp = MASK_OPS[ins.opcode[:3]]
+        self.VM = [1 if cmp(a.signed(), b.signed()) else 0 for a, b in zip(veca, vecb)]
 
     @executor("SEQVS", "SNEVS", "SGTVS", "SLTVS", "SGEVS", "SLEVS")
     def exec_svs(self, ins):
         veca = self.VRF.Read(ins.op(0))
-        b = self.SRF.Read(ins.op(1))
-        if ins.opcode == "SEQVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() == b.signed() else 0
-        elif ins.opcode == "SNEVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() != b.signed() else 0
-        elif ins.opcode == "SGTVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() > b.signed() else 0
-        elif ins.opcode == "SLTVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() < b.signed() else 0
-        elif ins.opcode == "SGEVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() >= b.signed() else 0
-        elif ins.opcode == "SLEVS":
-            for i in range(Core.MVL):
-                self.VM[i] = 1 if veca[i].signed() <= b.signed() else 0
-        else:
-            raise NotImplementedError(f"Opcode not supported in exec_svs: {ins.opcode}")        
+        b = self.SRF.Read(ins.op(1)).signed()
+        if ins.opcode not in {"SEQVS", "SNEVS", "SGTVS", "SLTVS", "SGEVS", "SLEVS"}:
+            raise NotImplementedError(f"Opcode not supported in exec_svs: {ins.opcode}")
+        cmp = MASK_OPS[ins.opcode[:3]]
+        self.VM = [1 if cmp(a.signed(), b) else 0 for a in veca]
 
-    def dumpregs(self, iodir):
-        self.SRF.dump(iodir)
-        self.VRF.dump(iodir)
+    def dumpregs(self, iodir, suffix=""):
+        self.SRF.dump(iodir, suffix)
+        self.VRF.dump(iodir, suffix)
 
-    def dumptrace(self, iodir):
+    def dumptrace(self, iodir, suffix=""):
         if self.trace is None:
             return
 
-        opfilepath = os.path.abspath(os.path.join(iodir, "trace.txt"))
+        opfilepath = os.path.abspath(os.path.join(iodir, "trace" + suffix + ".txt"))
+        # PC, opcode and operands text of every static instruction, formatted once
+        text = {}
+        lines = list(self.trace_prefix)
+        for pc, dynins, value in self.trace:
+            ins = text.get(pc)
+            if ins is None:
+                ins = text[pc] = f"{pc}: {dynins.opcode} " + " ".join(str(o) for o in dynins.ops)
+            if value is not None:
+                if type(value) is list:
+                    value = ",".join(map(str, value))
+                lines.append(f"{ins} ({value})\n")
+            else:
+                lines.append(ins + "\n")
         with open(opfilepath, "w") as opf:
-            for dynins, value in self.trace:
-                ops = " ".join(str(o) for o in dynins.ops)
-                if value is not None:
-                    if type(value) is list:
-                        value = ",".join(str(v) for v in value)
-                    opf.write(f"{dynins.opcode} {ops} ({value})\n")
-                else:
-                    opf.write(f"{dynins.opcode} {ops}\n")
+            opf.write("".join(lines))
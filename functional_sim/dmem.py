@@ -2,22 +2,32 @@ import os
 
 from bitvec import BitVec
 
+# Words are never modified in place, only replaced by Write,
+# so all words not in the input file share one zero
+ZERO = BitVec(0x0)
+
 class DMEM(object):
     # Word addressible - each address contains 32 bits.
-    def __init__(self, name, iodir, addressLen):
+    def __init__(self, name, iodir, addressLen, suffix=""):
         self.name = name
         self.size = pow(2, addressLen)
         self.min_value = -pow(2, 31)
         self.max_value = pow(2, 31) - 1
-        self.ipfilepath = os.path.abspath(os.path.join(iodir, name + ".txt"))
-        self.opfilepath = os.path.abspath(os.path.join(iodir, name + "OP.txt"))
+        # Memory of one core of a multi-core run, e.g. suffix _1 loads SDMEM_1.txt,
+        # or SDMEM.txt if the core has no own file, and dumps SDMEMOP_1.txt
+        self.ipfilepath = os.path.abspath(os.path.join(iodir, name + suffix + ".txt"))
+        if not os.path.isfile(self.ipfilepath):
+            self.ipfilepath = os.path.abspath(os.path.join(iodir, name + ".txt"))
+        self.opfilepath = os.path.abspath(os.path.join(iodir, name + "OP" + suffix + ".txt"))
         self.data = []
+        # Incremented by every write which changes a value
+        self.version = 0
 
         with open(self.ipfilepath, "r") as ipf:
-            self.data = [BitVec(int(line.strip())) for line in ipf.readlines()]
+            self.data = [BitVec(int(line)) for line in ipf.read().splitlines()]
         print(self.name, "- Data loaded from file:", self.ipfilepath)
         # print(self.name, "- Data:", self.data)
-        self.data.extend([BitVec(0x0) for i in range(self.size - len(self.data))])
+        self.data.extend([ZERO] * (self.size - len(self.data)))
 
     def Read(self, idx):  # Use this to read from DMEM.
         if idx < self.size:
@@ -29,6 +39,8 @@ class DMEM(object):
 
     def Write(self, idx, val):  # Use this to write into DMEM.
         if idx < self.size:
+            if self.data[idx].val != val.val:
+                self.version += 1
             self.data[idx] = val
         else:
             raise IndexError(
@@ -36,7 +48,14 @@ class DMEM(object):
             )
 
     def dump(self):
+        # Most words hold few distinct values, so each is formatted once
+        text = {}
+        lines = []
+        for data in self.data:
+            line = text.get(data.val)
+            if line is None:
+                line = text[data.val] = str(data) + "\n"
+            lines.append(line)
         with open(self.opfilepath, "w") as opf:
-            lines = [str(data) + "\n" for data in self.data]
-            opf.writelines(lines)
+            opf.write("".join(lines))
         print(self.name, "- Dumped data into output file in path:", self.opfilepath)
@@ -0,0 +1,41 @@
+import os
+import sys
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+import memfootprint
+
+from imem import IMEM
+from dmem import DMEM
+from regfile import RegisterFile
+from core import Core
+from multicore import MultiCore
+from accessprofile import AccessProfile
+from incremental import Snapshots
+
+# Subsystem of the memory allocated by a module or a function, functions take
+# precedence over the module they are in. Allocations of other modules are
+# charged to the nearest caller listed here.
+RULES = [
+    (IMEM, "IMEM"),
+    (DMEM, "DMEM"),
+    (RegisterFile, "RegisterFile"),
+    (Core.run, "trace"),
+    (Core.trace_value, "trace"),
+    # Vector load and store addresses, kept as their trace values
+    (Core.get_mem_addresses, "trace"),
+    (Core.dumptrace, "trace"),
+    (Core, "Core"),
+    (MultiCore, "Core"),
+    (AccessProfile, "access profile"),
+    (Snapshots, "snapshots"),
+]
+
+
+class Footprint(memfootprint.Footprint):
+    # Footprint of the subsystems of this simulator, see common/memfootprint.py
+    def __init__(self, rules=RULES):
+        super().__init__(rules)
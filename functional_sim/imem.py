@@ -48,10 +48,12 @@ class Instruction(object):
 
 
 class IMEM(object):
-    def __init__(self, iodir):
+    def __init__(self, iodir, filename="Code.asm"):
         self.size = pow(2, 16)  # Can hold a maximum of 2^16 instructions.
-        self.filepath = os.path.abspath(os.path.join(iodir, "Code.asm"))
+        self.filepath = os.path.abspath(os.path.join(iodir, filename))
         self.instructions = []
+        # Text of every instruction without comments, index is the PC
+        self.lines = []
 
         with open(self.filepath, "r") as insf:
             for line in insf:
@@ -61,6 +63,7 @@ class IMEM(object):
                 line = line.strip()
                 if line:
                     self.instructions.append(Instruction(line))
+                    self.lines.append(line)
         print("IMEM - Instructions loaded from file:", self.filepath)
 
     def Read(self, idx):  # Use this to read from IMEM.
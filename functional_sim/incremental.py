@@ -0,0 +1,147 @@
+import os
+import json
+import pickle
+import difflib
+import hashlib
+from array import array
+from itertools import islice
+
+from bitvec import BitVec
+from dmem import ZERO
+from observer import Observer
+
+# Folder of the snapshots inside the test folder
+SNAPSHOT_DIR = ".incremental"
+# Input files a run depends on besides Code.asm
+INPUT_FILES = ["SDMEM.txt", "VDMEM.txt", "Config.txt"]
+
+
+def file_hash(filepath):
+    if not os.path.isfile(filepath):
+        return None
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Snapshots(Observer):
+    # Periodic snapshots of the architectural state of the functional Core,
+    # kept in <iodir>/.incremental/functional with the program and the input
+    # hashes of the run. Every snapshot records the highest PC executed before
+    # it. After an edit of Code.asm, the run resumes from the last snapshot whose
+    # highest PC is below the first changed instruction: everything before it
+    # executed unchanged code on unchanged inputs. The trace of the skipped
+    # instructions is taken from the previous trace.txt.
+    def __init__(self, iodir, interval=20000):
+        self.iodir = iodir
+        self.dirpath = os.path.join(iodir, SNAPSHOT_DIR, "functional")
+        self.interval = interval
+        self.next_count = interval
+        self.max_pc = -1
+        # Snapshots valid for this run, as {"count", "max_pc", "file"}
+        self.taken = []
+        self.meta = None
+        metapath = os.path.join(self.dirpath, "meta.json")
+        if os.path.isfile(metapath):
+            with open(metapath, "r") as mf:
+                self.meta = json.load(mf)
+
+    def inputs(self):
+        return {name: file_hash(os.path.join(self.iodir, name)) for name in INPUT_FILES}
+
+    def resume(self, core, imem, trace):
+        # Restore the core to the best snapshot of the previous run, if any
+        meta = self.meta
+        if meta is None:
+            print("Incremental - No previous run, running from PC 0")
+            return
+        if meta["inputs"] != self.inputs():
+            print("Incremental - Input data or config changed, running from PC 0")
+            return
+        tracepath = os.path.join(self.iodir, "trace.txt")
+        if trace and (not meta["trace"] or file_hash(tracepath) != meta["trace_hash"]):
+            print("Incremental - No trace of the previous run, running from PC 0")
+            return
+
+        matcher = difflib.SequenceMatcher(None, meta["program"], imem.lines, autojunk=False)
+        changes = [op for op in matcher.get_opcodes() if op[0] != "equal"]
+        # Instructions before the first change have the same PC in both programs
+        first = changes[0][1] if changes else max(len(imem.lines), len(meta["program"])) + 1
+        valid = [snap for snap in meta["snapshots"] if snap["max_pc"] < first]
+        if changes:
+            print(f"Incremental - {len(changes)} changed blocks, first changed PC {first}")
+        if not valid:
+            print("Incremental - No snapshot before the first changed instruction, running from PC 0")
+            return
+
+        snap = valid[-1]
+        with open(os.path.join(self.dirpath, snap["file"]), "rb") as sf:
+            state = pickle.load(sf)
+        self.restore(core, state)
+        self.taken = valid
+        self.max_pc = snap["max_pc"]
+        self.next_count = snap["count"] + self.interval
+        if trace:
+            with open(tracepath, "r") as tf:
+                core.trace_prefix = list(islice(tf, snap["count"]))
+        print(f"Incremental - Resumed from snapshot at instruction {snap['count']}, PC {core.PC}")
+
+    @staticmethod
+    def restore(core, state):
+        core.PC = state["PC"]
+        core.VL = state["VL"]
+        core.count = state["count"]
+        core.VM = list(state["VM"])
+        core.SRF.registers = [[BitVec(val)] for val in state["SRF"]]
+        core.VRF.registers = [[BitVec(val) for val in reg] for reg in state["VRF"]]
+        for mem, name in ((core.SDMEM, "SDMEM"), (core.VDMEM, "VDMEM")):
+            mem.data = [BitVec(val) if val else ZERO for val in state[name]]
+            mem.version = state[name + "_version"]
+
+    def step(self, core, count):
+        if count >= self.next_count:
+            core.count = count
+            self.take(core)
+        if core.PC > self.max_pc:
+            self.max_pc = core.PC
+
+    def take(self, core):
+        # Before executing instruction `core.count`
+        state = {
+            "PC": core.PC,
+            "VL": core.VL,
+            "count": core.count,
+            "VM": core.VM,
+            "SRF": [reg[0].val for reg in core.SRF.registers],
+            "VRF": [[word.val for word in reg] for reg in core.VRF.registers],
+            "SDMEM": array("q", (word.val for word in core.SDMEM.data)),
+            "VDMEM": array("q", (word.val for word in core.VDMEM.data)),
+            "SDMEM_version": core.SDMEM.version,
+            "VDMEM_version": core.VDMEM.version,
+        }
+        os.makedirs(self.dirpath, exist_ok=True)
+        filename = f"snapshot_{core.count}.pkl"
+        with open(os.path.join(self.dirpath, filename), "wb") as sf:
+            pickle.dump(state, sf, protocol=pickle.HIGHEST_PROTOCOL)
+        self.taken.append({"count": core.count, "max_pc": self.max_pc, "file": filename})
+        self.next_count = core.count + self.interval
+
+    def save(self, imem, trace):
+        # Record the program and inputs of this run, after trace.txt is written
+        os.makedirs(self.dirpath, exist_ok=True)
+        meta = {
+            "program": imem.lines,
+            "inputs": self.inputs(),
+            "trace": trace,
+            "trace_hash": file_hash(os.path.join(self.iodir, "trace.txt")) if trace else None,
+            "snapshots": self.taken,
+        }
+        with open(os.path.join(self.dirpath, "meta.json"), "w") as mf:
+            json.dump(meta, mf)
+        # Remove the snapshots of the previous run taken after the resume point
+        keep = {snap["file"] for snap in self.taken}
+        for filename in os.listdir(self.dirpath):
+            if filename.endswith(".pkl") and filename not in keep:
+                os.remove(os.path.join(self.dirpath, filename))
@@ -1,9 +1,19 @@
 import os
+import sys
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from imem import IMEM
 from dmem import DMEM
 from core import Core
+from regfile import Reg
+from config import read_config
+from accessprofile import AccessProfile
+from progress import Progress, Runaway
+from incremental import Snapshots
+from multicore import MultiCore
+from footprint import Footprint
 
 if __name__ == "__main__":
     # parse arguments for input file location
@@ -15,27 +25,155 @@ if __name__ == "__main__":
         help="Path to the folder containing the input files - instructions and data.",
     )
     parser.add_argument("--trace", default=False, action='store_true', help="Generate execution trace")
+    parser.add_argument(
+        "--access-profile",
+        default=False,
+        action="store_true",
+        help="Generate per instruction vector memory access profile",
+    )
+    parser.add_argument(
+        "--banks",
+        default=None,
+        type=int,
+        help="Number of VDMEM banks for the access profile, default from Config.txt",
+    )
+    parser.add_argument(
+        "--progress",
+        default=0,
+        type=float,
+        help="Report progress every PROGRESS seconds to stderr, and abort programs which loop without progress",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        type=str,
+        help="Also write progress metrics to this file, Prometheus text format if it ends in .prom, else JSON lines",
+    )
+    parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="Keep state snapshots, and resume from the last one before the first instruction changed since the previous run",
+    )
+    parser.add_argument("--snapshot-interval", default=20000, type=int, help="Instructions between two --incremental snapshots")
+    parser.add_argument(
+        "--cores",
+        default=1,
+        type=int,
+        help="Run this many cores sharing VDMEM, core i runs Code_i.asm and SDMEM_i.txt if present",
+    )
+    parser.add_argument("--quantum", default=1, type=int, help="Instructions every core runs per turn with --cores")
+    parser.add_argument(
+        "--mem-footprint",
+        default=False,
+        action="store_true",
+        help="Trace memory allocations and write the memory per subsystem after load, run and dump to footprint.json",
+    )
     args = parser.parse_args()
+    if args.incremental and args.access_profile:
+        parser.error("--access-profile needs a full run, it can not be combined with --incremental")
+    if args.cores > 1 and (args.incremental or args.access_profile or args.progress > 0):
+        parser.error("--cores can not be combined with --incremental, --access-profile or --progress")
 
     iodir = os.path.abspath(args.iodir)
     print("IO Directory:", iodir)
+    footprint = Footprint() if args.mem_footprint else None
 
-    # Parse IMEM
-    imem = IMEM(iodir)
-    # Parse SMEM
-    sdmem = DMEM("SDMEM", iodir, 13)  # 32 KB is 2^15 bytes = 2^13 K 32-bit words.
-    # Parse VMEM
-    vdmem = DMEM("VDMEM", iodir, 17)  # 512 KB is 2^19 bytes = 2^17 K 32-bit words.
+    # Architecture parameters, from Config.txt if present
+    config = read_config(iodir)
+    Reg.configure(config["numScalarRegs"], config["numVectorRegs"])
+
+    if args.cores > 1:
+        start = time.perf_counter()
+        vdmem = DMEM("VDMEM", iodir, config["vdmemAddrBits"])
+        system = MultiCore(iodir, args.cores, vdmem, config, trace=args.trace, quantum=args.quantum)
+        load_time = time.perf_counter() - start
+        if footprint is not None:
+            footprint.phase("load")
+        start = time.perf_counter()
+        system.run()
+        run_time = time.perf_counter() - start
+        if footprint is not None:
+            footprint.phase("run")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for dump in [pool.submit(*dump) for dump in system.dumps()]:
+                dump.result()
+        dump_time = time.perf_counter() - start
+        print(system.report())
+        if footprint is not None:
+            footprint.phase("dump")
+            footprint.dump(iodir)
+            print(footprint.report())
+        print(f"Time - load {load_time:.3f}s, compute: {run_time:.3f}s, dump {dump_time:.3f}s")
+        exit(0)
+
+    # Input files are independent, load them concurrently
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # Parse IMEM
+        imem = pool.submit(IMEM, iodir)
+        # Parse SMEM
+        sdmem = pool.submit(DMEM, "SDMEM", iodir, config["sdmemAddrBits"])
+        # Parse VMEM
+        vdmem = pool.submit(DMEM, "VDMEM", iodir, config["vdmemAddrBits"])
+        imem, sdmem, vdmem = imem.result(), sdmem.result(), vdmem.result()
+    load_time = time.perf_counter() - start
 
     # Create Vector Core
-    vcore = Core(imem, sdmem, vdmem, trace=args.trace)
+    if args.access_profile:
+        banks = args.banks if args.banks is not None else config.get("vdmNumBanks", 16)
+        profile = AccessProfile(banks)
+    else:
+        profile = None
+    snapshots = Snapshots(iodir, args.snapshot_interval) if args.incremental else None
+    vcore = Core(
+        imem, sdmem, vdmem, trace=args.trace, access_profile=profile,
+        mvl=config["maxVectorLength"], num_sregs=config["numScalarRegs"], num_vregs=config["numVectorRegs"],
+        progress=Progress(args.progress, args.metrics_file) if args.progress > 0 else None,
+        snapshots=snapshots,
+    )
+    if snapshots is not None:
+        snapshots.resume(vcore, imem, args.trace)
+    if footprint is not None:
+        footprint.phase("load")
 
     # Run Core
-    vcore.run()
-    vcore.dumpregs(iodir)
-    vcore.dumptrace(iodir)
+    start = time.perf_counter()
+    try:
+        vcore.run()
+    except Runaway as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    run_time = time.perf_counter() - start
+    if footprint is not None:
+        footprint.phase("run")
 
-    sdmem.dump()
-    vdmem.dump()
+    # Every output is a separate file, dump them concurrently
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        dumps = [
+            pool.submit(vcore.dumpregs, iodir),
+            pool.submit(vcore.dumptrace, iodir),
+            pool.submit(sdmem.dump),
+            pool.submit(vdmem.dump),
+        ]
+        if profile is not None:
+            dumps.append(pool.submit(profile.dump, iodir))
+        for dump in dumps:
+            dump.result()
+    dump_time = time.perf_counter() - start
+    if snapshots is not None:
+        snapshots.save(imem, args.trace)
+    if footprint is not None:
+        footprint.phase("dump")
+        footprint.dump(iodir)
+        print(footprint.report())
+
+    total = load_time + run_time + dump_time
+    print(
+        f"Time - I/O: {load_time + dump_time:.3f}s (load {load_time:.3f}s, dump {dump_time:.3f}s), "
+        f"compute: {run_time:.3f}s, I/O share: {100.0 * (load_time + dump_time) / total:.1f}%"
+    )
 
     # THE END
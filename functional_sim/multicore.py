@@ -0,0 +1,47 @@
+import os
+
+from imem import IMEM
+from dmem import DMEM
+from core import Core
+
+
+class MultiCore(object):
+    # N functional cores sharing one VDMEM. Core i runs Code_i.asm on its own
+    # scalar memory SDMEM_i.txt, falling back to Code.asm and SDMEM.txt, so the
+    # cores run different programs or the same program on different data.
+    # Cores take turns of `quantum` instructions in core order, so runs are
+    # deterministic and every core sees the vector stores of the others.
+    def __init__(self, iodir, num_cores, vdmem, config, trace=False, quantum=1):
+        self.iodir = iodir
+        self.vdmem = vdmem
+        self.quantum = quantum
+        self.cores = []
+        for i in range(num_cores):
+            codefile = f"Code_{i}.asm" if os.path.isfile(os.path.join(iodir, f"Code_{i}.asm")) else "Code.asm"
+            imem = IMEM(iodir, codefile)
+            sdmem = DMEM("SDMEM", iodir, config["sdmemAddrBits"], suffix=f"_{i}")
+            self.cores.append(Core(
+                imem, sdmem, vdmem, trace=trace,
+                mvl=config["maxVectorLength"], num_sregs=config["numScalarRegs"], num_vregs=config["numVectorRegs"],
+            ))
+
+    def run(self):
+        active = list(self.cores)
+        while active:
+            for core in active:
+                core.run(core.count + self.quantum)
+            active = [core for core in active if not core.halted]
+
+    def dumps(self):
+        # Output dump functions, for every core its registers, scalar memory
+        # and trace with suffix _i, then the shared VDMEM
+        dumps = []
+        for i, core in enumerate(self.cores):
+            dumps.append((core.dumpregs, self.iodir, f"_{i}"))
+            dumps.append((core.dumptrace, self.iodir, f"_{i}"))
+            dumps.append((core.SDMEM.dump,))
+        dumps.append((self.vdmem.dump,))
+        return dumps
+
+    def report(self):
+        return "\n".join(f"Core {i} - Instructions: {core.count}" for i, core in enumerate(self.cores))
@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from hooks import bind
+
+
+class Observer(object):
+    # Events of the functional Core. An observer overrides the events it
+    # needs and is passed to the Core, which binds the overridden events once
+    # when it is created, see hook(). Events nobody overrides cost the run
+    # loop a test of a local variable, and no call.
+
+    def step(self, core, count):
+        # Before executing the instruction at core.PC, the `count`th executed
+        pass
+
+    def retire(self, core, ins):
+        # After executing ins, core.PC is still its PC
+        pass
+
+    def vector_access(self, core, ins, addrs):
+        # VDMEM addresses of a vector load or store, masked elements included
+        pass
+
+    def scalar_access(self, core, ins, addr):
+        # SDMEM address of a scalar load or store
+        pass
+
+    def finish(self, core, count):
+        # End of the run, after `count` instructions
+        pass
+
+
+def hook(observers, event):
+    # The call of `event` on all observers which override it,
+    # None if there are none
+    return bind(Observer, observers, event)
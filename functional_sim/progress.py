@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from observer import Observer
+from telemetry import rss_bytes, Runaway, MetricsFile
+
+# Instructions between two samples of the clock, a power of 2 minus 1 as mask
+SAMPLE_MASK = 0xFFF
+
+
+class Progress(Observer):
+    # Periodic progress report of the functional Core.
+    # sample() runs every SAMPLE_MASK + 1 instructions, which only
+    # reads the clock until `interval` seconds passed since the last report.
+    # Reports go to stderr and, if given, to a metrics file, see MetricsFile.
+    # Every report also hashes the architectural state and watches its PC,
+    # sample() runs again when the core gets back to that PC. A deterministic
+    # core in the same state twice loops forever, so the run is aborted.
+    def __init__(self, interval, metrics_file=None):
+        self.interval = interval
+        self.metrics_file = None if metrics_file is None else MetricsFile(metrics_file, "vmips_functional_")
+        self.start = time.monotonic()
+        self.last_time = self.start
+        self.last_count = 0
+        self.watch_pc = -1
+        self.anchor = None
+
+    def step(self, core, count):
+        if core.PC == self.watch_pc or not (count & SAMPLE_MASK):
+            self.sample(core, count)
+
+    def sample(self, core, count):
+        if core.PC == self.watch_pc and count != self.anchor[0]:
+            # Compare once, the watch is set again by the next report
+            self.watch_pc = -1
+            if self.state(core) == self.anchor[1]:
+                raise Runaway(f"Progress - ERROR: No progress, architectural state repeats at PC {core.PC}")
+        if count & SAMPLE_MASK:
+            return
+        now = time.monotonic()
+        if now - self.last_time < self.interval:
+            return
+        self.report(core, count, now)
+        self.anchor = (count, self.state(core))
+        self.watch_pc = core.PC
+
+    def state(self, core):
+        # Memory contents are represented by their version, which only
+        # changes when a write changes a value
+        return hash((
+            core.VL,
+            tuple(core.VM),
+            tuple(reg[0].val for reg in core.SRF.registers),
+            tuple(word.val for reg in core.VRF.registers for word in reg),
+            core.SDMEM.version,
+            core.VDMEM.version,
+        ))
+
+    def report(self, core, count, now, final=False):
+        elapsed = now - self.start
+        metrics = {
+            "instructions": count,
+            "instructions_per_second": (count - self.last_count) / max(now - self.last_time, 1e-9),
+            "pc": core.PC,
+            "rss_bytes": rss_bytes(),
+            "elapsed_seconds": elapsed,
+        }
+        self.last_time, self.last_count = now, count
+        print(
+            f"Progress - {'Done' if final else 'Running'} {elapsed:.1f}s: instructions {count}"
+            f" ({metrics['instructions_per_second']:.0f}/s), PC {core.PC}, RSS {metrics['rss_bytes'] >> 20} MB",
+            file=sys.stderr,
+        )
+        if self.metrics_file is not None:
+            self.metrics_file.write(metrics, final)
+
+    def finish(self, core, count):
+        self.report(core, count, time.monotonic(), final=True)
@@ -1,21 +1,31 @@
 import os
+import re
 from bitvec import BitVec
 
+# Register operand, e.g. SR1 or VR7
+REG_RE = re.compile(r"(SR|VR)(\d+)$")
+
 
 class Reg(object):
     """
     Defines name of architectural registers.
-    Scalar: SR0 - SR7
-    Vector: VR0 - VR7
+    Scalar: SR0 - SR<numScalarRegs-1>, SR0 - SR7 by default
+    Vector: VR0 - VR<numVectorRegs-1>, VR0 - VR7 by default
     """
 
     SCALAR = "SR"
     VECTOR = "VR"
 
+    # Number of registers of each type, set by configure()
+    COUNT = {SCALAR: 8, VECTOR: 8}
+
+    # Interned registers, every register is created only once
+    INTERNED = {}
+
     def __init__(self, ty=SCALAR, idx=1):
         if ty not in {Reg.SCALAR, Reg.VECTOR}:
             raise Exception(f"Invalid type: {ty}")
-        if idx < 0 or idx > 7:
+        if idx < 0 or idx >= Reg.COUNT[ty]:
             raise Exception(f"Invalid index: {idx}")
         self.ty = ty
         self.idx = idx
@@ -26,14 +36,29 @@ class Reg(object):
     def __eq__(self, other):
         return self.ty == other.ty and self.idx == other.idx
 
+    @staticmethod
+    def configure(num_scalar, num_vector):
+        # Set the register counts, before any instruction is parsed
+        Reg.COUNT = {Reg.SCALAR: num_scalar, Reg.VECTOR: num_vector}
+        Reg.INTERNED = {}
+
+    @staticmethod
+    def get(ty, idx):
+        key = (ty, idx)
+        if key not in Reg.INTERNED:
+            Reg.INTERNED[key] = Reg(ty, idx)
+        return Reg.INTERNED[key]
+
     @staticmethod
     def parse(s):
         # Parse string and determine register type and index
-        try:
-            return Reg(s[:2], int(s[2:]))
-        except Exception as e:
-            # print(s, e)
+        m = REG_RE.match(s)
+        if m is None:
+            return None
+        idx = int(m.group(2))
+        if idx >= Reg.COUNT[m.group(1)]:
             return None
+        return Reg.get(m.group(1), idx)
 
 
 class RegisterFile(object):
@@ -45,11 +70,10 @@ class RegisterFile(object):
         self.reg_bits = size
         self.min_value = -pow(2, self.reg_bits - 1)
         self.max_value = pow(2, self.reg_bits - 1) - 1
-        # Register file as list of lists
-        self.registers = [
-            [BitVec(0, size) for e in range(self.vec_length)]
-            for r in range(self.reg_count)
-        ]
+        # Register file as list of lists. Words are never modified in place,
+        # only replaced by Write, so all registers start with one shared zero
+        zero = BitVec(0, size)
+        self.registers = [[zero] * self.vec_length for r in range(self.reg_count)]
 
     def Read(self, reg):
         # print(f"    READ Reg[{reg}]: {self.registers[reg.idx]}")
@@ -74,12 +98,13 @@ class RegisterFile(object):
             self.registers[reg.idx][0] = val
         else:
             # Update with mask
+            regdata = self.registers[reg.idx]
             for i in range(length):
                 if mask[i]:
-                    self.registers[reg.idx][i] = val[i]
+                    regdata[i] = val[i]
 
-    def dump(self, iodir):
-        opfilepath = os.path.abspath(os.path.join(iodir, self.name + ".txt"))
+    def dump(self, iodir, suffix=""):
+        opfilepath = os.path.abspath(os.path.join(iodir, self.name + suffix + ".txt"))
         with open(opfilepath, "w") as opf:
             row_format = "{:<13}" * self.vec_length + "\n"
             lines = [
@@ -90,5 +115,5 @@ class RegisterFile(object):
                 row_format.format(*[str(val) for val in data])
                 for data in self.registers
             ]
-            opf.writelines(lines)
+            opf.write("".join(lines))
         print(self.name, "- Dumped data into output file in path:", opfilepath)
@@ -0,0 +1,439 @@
+import os
+import random
+import argparse
+
+# Workload generator for VMIPS programs.
+# Emits Code.asm, SDMEM.txt, VDMEM.txt and Config.txt for a parameterized
+# kernel, and the expected VDMEM contents after execution in
+# expected/exp_VDMEMOP.txt, computed directly from the kernel definition
+# without the simulators.
+
+MVL = 64
+VDMEM_SIZE = 2 ** 17
+SDMEM_SIZE = 2 ** 13
+
+CONFIG = """# Dispatch Queue parameters
+dataQueueDepth = 4
+computeQueueDepth = 4
+
+# VDMEM LS parameters
+vdmNumBanks = 16
+vdmBankWait = 4
+vlsPipelineDepth = 11
+
+# Compute Pipeline parameters
+numLanes = 4
+pipelineDepthMul = 12
+pipelineDepthAdd = 2
+pipelineDepthDiv = 8
+"""
+
+
+def wrap32(val):
+    # Value as stored in a 32 bit register, signed
+    val &= 0xFFFFFFFF
+    return val - (1 << 32) if val & 0x80000000 else val
+
+
+class Program(object):
+    # Assembly program with labels.
+    # Branch targets are written as @label and resolved to PC offsets.
+    def __init__(self):
+        self.lines = []  # (instruction, comment) or label name
+
+    def label(self, name):
+        self.lines.append(name)
+
+    def ins(self, text, comment=""):
+        self.lines.append((text, comment))
+
+    def assemble(self):
+        labels = {}
+        pc = 0
+        for line in self.lines:
+            if type(line) is str:
+                labels[line] = pc
+            else:
+                pc += 1
+        out = []
+        pc = 0
+        for line in self.lines:
+            if type(line) is str:
+                out.append(f"#{line}:")
+                continue
+            text, comment = line
+            tokens = text.split(" ")
+            if tokens[-1].startswith("@"):
+                tokens[-1] = str(labels[tokens[-1][1:]] - pc)
+            text = " ".join(tokens)
+            out.append(f"{text:<22}#{comment}" if comment else text)
+            pc += 1
+        return "\n".join(out) + "\n"
+
+
+def strip_loop_head(prog, name):
+    # Start of a strip-mined loop over SR6 remaining elements,
+    # sets SR2 = VL = min(MVL, remaining)
+    prog.label(name)
+    prog.ins("ADD SR2 SR1 SR0", "VL = MVL")
+    prog.ins(f"BGE SR6 SR1 @{name}_full", "full strip if remaining >= MVL")
+    prog.ins("ADD SR2 SR6 SR0", "VL = remaining")
+    prog.label(f"{name}_full")
+    prog.ins("MTCL SR2")
+
+
+def strip_loop_tail(prog, name):
+    prog.ins("SUB SR6 SR6 SR2", "update remaining")
+    prog.ins(f"BGT SR6 SR0 @{name}", "stay in loop if elements remain")
+
+
+def reduce_vector(prog, vr, scratch_idx, name):
+    # Sum all MVL elements of vr into element 0, by halving the vector
+    # through the scratch area. Leaves VL = 1.
+    prog.ins("MTCL SR1", "reduce over MVL elements")
+    prog.ins(f"LS SR5 SR0 {scratch_idx}", "SR5 = scratch address")
+    prog.ins("LS SR2 SR0 0", "SR2 = 1")
+    prog.ins("ADD SR7 SR1 SR0", "SR7 = current length")
+    prog.label(name)
+    prog.ins(f"SV {vr} SR5")
+    prog.ins("SRL SR7 SR7 SR2", "halve length")
+    prog.ins("MTCL SR7")
+    prog.ins(f"LV {vr} SR5")
+    prog.ins("ADD SR6 SR5 SR7")
+    prog.ins("LV VR6 SR6", "upper half")
+    prog.ins(f"ADDVV {vr} {vr} VR6")
+    prog.ins(f"BGT SR7 SR2 @{name}", "until length is 1")
+
+
+def clear_scratch(prog, scratch_idx):
+    prog.ins("MTCL SR1")
+    prog.ins(f"LS SR5 SR0 {scratch_idx}")
+    prog.ins("SV VR0 SR5", "clear scratch area")
+
+
+class Workload(object):
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.prog = Program()
+        self.sdmem = [0] * 64
+        self.vdmem = []
+        self.expected = None
+
+    def alloc(self, data):
+        # Place data in VDMEM, return its base address
+        base = len(self.vdmem)
+        self.vdmem.extend(data)
+        return base
+
+    def values(self, count, low=-100, high=100):
+        return [self.rng.randint(low, high) for _ in range(count)]
+
+    def finish_expected(self, outputs):
+        # Expected final VDMEM: input data with outputs written over it
+        self.expected = self.vdmem + [0] * (VDMEM_SIZE - len(self.vdmem))
+        for addr, val in outputs.items():
+            self.expected[addr] = wrap32(val)
+
+    def write(self, outdir):
+        if len(self.vdmem) > VDMEM_SIZE:
+            raise ValueError(f"Workload needs {len(self.vdmem)} VDMEM words, only {VDMEM_SIZE} available")
+        os.makedirs(os.path.join(outdir, "expected"), exist_ok=True)
+        with open(os.path.join(outdir, "Code.asm"), "w") as f:
+            f.write(self.prog.assemble())
+        with open(os.path.join(outdir, "SDMEM.txt"), "w") as f:
+            f.write("".join(f"{v}\n" for v in self.sdmem))
+        with open(os.path.join(outdir, "VDMEM.txt"), "w") as f:
+            f.write("".join(f"{v}\n" for v in self.vdmem))
+        with open(os.path.join(outdir, "Config.txt"), "w") as f:
+            f.write(CONFIG)
+            if MVL != 64:
+                f.write(f"\n# Vector parameters\nmaxVectorLength = {MVL}\n")
+        with open(os.path.join(outdir, "expected", "exp_VDMEMOP.txt"), "w") as f:
+            f.write("".join(f"{v}\n" for v in self.expected))
+        print("Workload - Written to folder:", os.path.abspath(outdir))
+
+
+def gen_matmul(wl, n, m, k):
+    # C[n x m] = A[n x k] * B[k x m], row major.
+    # Every C element is a dot product of a row of A and a strided column
+    # of B, strip-mined over k, then reduced to a scalar.
+    A = wl.values(n * k)
+    B = wl.values(k * m)
+    a_base = wl.alloc(A)
+    b_base = wl.alloc(B)
+    c_base = wl.alloc([0] * (n * m))
+    scratch = wl.alloc([0] * MVL)
+    rem = k % MVL
+    sd = wl.sdmem
+    sd[0:11] = [1, m, k, a_base, b_base, c_base, scratch, MVL * m, rem, rem * m, n]
+    # sd[16..20] hold the loop state: rows left, columns left, row of A, column of B, C pointer
+
+    p = wl.prog
+    p.ins("CVM", "clear mask")
+    p.ins("POP SR1", "SR1 = MVL")
+    p.ins("LS SR2 SR0 10")
+    p.ins("SS SR2 SR0 16", "rows left = n")
+    p.ins("LS SR2 SR0 3")
+    p.ins("SS SR2 SR0 18", "row of A")
+    p.ins("LS SR2 SR0 5")
+    p.ins("SS SR2 SR0 20", "C pointer")
+    p.label("row")
+    p.ins("LS SR2 SR0 1")
+    p.ins("SS SR2 SR0 17", "columns left = m")
+    p.ins("LS SR2 SR0 4")
+    p.ins("SS SR2 SR0 19", "column of B")
+    p.label("col")
+    p.ins("MTCL SR1")
+    p.ins("ADDVV VR1 VR0 VR0", "accumulator = 0")
+    p.ins("LS SR3 SR0 18", "SR3 = A pointer")
+    p.ins("LS SR4 SR0 19", "SR4 = B pointer")
+    p.ins("LS SR5 SR0 1", "SR5 = stride m")
+    p.ins("LS SR6 SR0 2", "SR6 = k left")
+    if rem:
+        p.ins("LS SR2 SR0 8", "first strip of k % MVL")
+        p.ins("MTCL SR2")
+        p.ins("LV VR2 SR3")
+        p.ins("LVWS VR3 SR4 SR5")
+        p.ins("MULVV VR4 VR2 VR3")
+        p.ins("ADDVV VR1 VR1 VR4")
+        p.ins("ADD SR3 SR3 SR2")
+        p.ins("LS SR7 SR0 9")
+        p.ins("ADD SR4 SR4 SR7")
+        p.ins("SUB SR6 SR6 SR2")
+        p.ins("MTCL SR1")
+    if k >= MVL:
+        p.ins("LS SR7 SR0 7", "SR7 = MVL * m")
+        p.label("dot")
+        p.ins("LV VR2 SR3", "row strip of A")
+        p.ins("LVWS VR3 SR4 SR5", "column strip of B")
+        p.ins("MULVV VR4 VR2 VR3")
+        p.ins("ADDVV VR1 VR1 VR4")
+        p.ins("ADD SR3 SR3 SR1")
+        p.ins("ADD SR4 SR4 SR7")
+        p.ins("SUB SR6 SR6 SR1")
+        p.ins("BGT SR6 SR0 @dot")
+    reduce_vector(p, "VR1", 6, "reduce")
+    p.ins("LS SR6 SR0 20")
+    p.ins("SV VR1 SR6", "store C element")
+    p.ins("ADD SR6 SR6 SR2")
+    p.ins("SS SR6 SR0 20")
+    p.ins("LS SR4 SR0 19")
+    p.ins("ADD SR4 SR4 SR2")
+    p.ins("SS SR4 SR0 19", "next column of B")
+    p.ins("LS SR3 SR0 17")
+    p.ins("SUB SR3 SR3 SR2")
+    p.ins("SS SR3 SR0 17")
+    p.ins("BGT SR3 SR0 @col")
+    p.ins("LS SR3 SR0 18")
+    p.ins("LS SR4 SR0 2")
+    p.ins("ADD SR3 SR3 SR4")
+    p.ins("SS SR3 SR0 18", "next row of A")
+    p.ins("LS SR3 SR0 16")
+    p.ins("SUB SR3 SR3 SR2")
+    p.ins("SS SR3 SR0 16")
+    p.ins("BGT SR3 SR0 @row")
+    clear_scratch(p, 6)
+    p.ins("HALT")
+
+    outputs = {}
+    for i in range(n):
+        for j in range(m):
+            outputs[c_base + i * m + j] = sum(A[i * k + t] * B[t * m + j] for t in range(k))
+    wl.finish_expected(outputs)
+
+
+def gen_strided(wl, length, stride):
+    # y[j] = x[j * stride] * alpha
+    x = wl.values((length - 1) * stride + 1)
+    alpha = wl.rng.randint(-10, 10)
+    x_base = wl.alloc(x)
+    y_base = wl.alloc([0] * length)
+    wl.sdmem[0:7] = [1, length, stride, x_base, y_base, alpha, MVL * stride]
+
+    p = wl.prog
+    p.ins("CVM", "clear mask")
+    p.ins("POP SR1", "SR1 = MVL")
+    p.ins("MTCL SR1")
+    p.ins("LS SR7 SR0 5")
+    p.ins("ADDVS VR7 VR0 SR7", "VR7 = alpha")
+    p.ins("LS SR3 SR0 3", "SR3 = x pointer")
+    p.ins("LS SR4 SR0 4", "SR4 = y pointer")
+    p.ins("LS SR5 SR0 2", "SR5 = stride")
+    p.ins("LS SR6 SR0 1", "SR6 = elements left")
+    p.ins("LS SR7 SR0 6", "SR7 = MVL * stride")
+    strip_loop_head(p, "strip")
+    p.ins("LVWS VR1 SR3 SR5")
+    p.ins("MULVV VR2 VR1 VR7")
+    p.ins("SV VR2 SR4")
+    p.ins("ADD SR3 SR3 SR7")
+    p.ins("ADD SR4 SR4 SR2")
+    strip_loop_tail(p, "strip")
+    p.ins("HALT")
+
+    wl.finish_expected({y_base + j: x[j * stride] * alpha for j in range(length)})
+
+
+def gen_gather(wl, length, table):
+    # y[perm[j]] = x[idx[j]] * alpha, gather from a table and scatter
+    x = wl.values(table)
+    idx = [wl.rng.randrange(table) for _ in range(length)]
+    perm = list(range(length))
+    wl.rng.shuffle(perm)
+    alpha = wl.rng.randint(-10, 10)
+    x_base = wl.alloc(x)
+    idx_base = wl.alloc(idx)
+    perm_base = wl.alloc(perm)
+    y_base = wl.alloc([0] * length)
+    wl.sdmem[0:7] = [1, length, x_base, idx_base, perm_base, y_base, alpha]
+
+    p = wl.prog
+    p.ins("CVM", "clear mask")
+    p.ins("POP SR1", "SR1 = MVL")
+    p.ins("MTCL SR1")
+    p.ins("LS SR7 SR0 6")
+    p.ins("ADDVS VR7 VR0 SR7", "VR7 = alpha")
+    p.ins("LS SR3 SR0 3", "SR3 = idx pointer")
+    p.ins("LS SR4 SR0 4", "SR4 = perm pointer")
+    p.ins("LS SR5 SR0 2", "SR5 = x base")
+    p.ins("LS SR6 SR0 1", "SR6 = elements left")
+    p.ins("LS SR7 SR0 5", "SR7 = y base")
+    strip_loop_head(p, "strip")
+    p.ins("LV VR1 SR3", "indices")
+    p.ins("LVI VR2 SR5 VR1", "gather")
+    p.ins("MULVV VR3 VR2 VR7")
+    p.ins("LV VR4 SR4", "permutation")
+    p.ins("SVI VR3 SR7 VR4", "scatter")
+    p.ins("ADD SR3 SR3 SR2")
+    p.ins("ADD SR4 SR4 SR2")
+    strip_loop_tail(p, "strip")
+    p.ins("HALT")
+
+    wl.finish_expected({y_base + perm[j]: x[idx[j]] * alpha for j in range(length)})
+
+
+def gen_conv(wl, length, taps):
+    # y[i] = sum_t w[t] * x[i + t], for i < length - taps + 1
+    outlen = length - taps + 1
+    if outlen <= 0:
+        raise ValueError("conv needs length >= taps")
+    x = wl.values(length)
+    w = wl.values(taps, -10, 10)
+    x_base = wl.alloc(x)
+    y_base = wl.alloc([0] * outlen)
+    # Weights are scalars in SDMEM from index 64
+    wl.sdmem[0:6] = [1, outlen, taps, 64, x_base, y_base]
+    wl.sdmem.extend(w)
+    if len(wl.sdmem) > SDMEM_SIZE:
+        raise ValueError("Too many taps for SDMEM")
+    # sd[16], sd[17] hold the x and y pointers of the current strip
+
+    p = wl.prog
+    p.ins("CVM", "clear mask")
+    p.ins("POP SR1", "SR1 = MVL")
+    p.ins("LS SR2 SR0 4")
+    p.ins("SS SR2 SR0 16", "x pointer")
+    p.ins("LS SR2 SR0 5")
+    p.ins("SS SR2 SR0 17", "y pointer")
+    p.ins("LS SR6 SR0 1", "SR6 = outputs left")
+    strip_loop_head(p, "strip")
+    p.ins("ADDVV VR1 VR0 VR0", "accumulator = 0")
+    p.ins("LS SR3 SR0 16", "SR3 = x + i + t")
+    p.ins("LS SR5 SR0 3", "SR5 = weight pointer")
+    p.ins("LS SR4 SR0 2", "SR4 = taps left")
+    p.label("tap")
+    p.ins("LS SR7 SR5 0", "SR7 = w[t]")
+    p.ins("LV VR2 SR3")
+    p.ins("MULVS VR3 VR2 SR7")
+    p.ins("ADDVV VR1 VR1 VR3")
+    p.ins("LS SR7 SR0 0")
+    p.ins("ADD SR3 SR3 SR7")
+    p.ins("ADD SR5 SR5 SR7")
+    p.ins("SUB SR4 SR4 SR7")
+    p.ins("BGT SR4 SR0 @tap")
+    p.ins("LS SR3 SR0 17")
+    p.ins("SV VR1 SR3", "store outputs")
+    p.ins("ADD SR3 SR3 SR2")
+    p.ins("SS SR3 SR0 17")
+    p.ins("LS SR3 SR0 16")
+    p.ins("ADD SR3 SR3 SR2")
+    p.ins("SS SR3 SR0 16")
+    strip_loop_tail(p, "strip")
+    p.ins("HALT")
+
+    wl.finish_expected({
+        y_base + i: sum(w[t] * x[i + t] for t in range(taps)) for i in range(outlen)
+    })
+
+
+def gen_reduce(wl, length):
+    # Sum and count of the positive elements of x, using vector masks.
+    # out[0] = sum, out[1] = count
+    x = wl.values(length)
+    x_base = wl.alloc(x)
+    out_base = wl.alloc([0, 0])
+    scratch = wl.alloc([0] * MVL)
+    wl.sdmem[0:5] = [1, length, x_base, out_base, scratch]
+
+    p = wl.prog
+    p.ins("CVM", "clear mask")
+    p.ins("POP SR1", "SR1 = MVL")
+    p.ins("MTCL SR1")
+    p.ins("ADDVV VR2 VR0 VR0", "sum accumulator = 0")
+    p.ins("LS SR3 SR0 2", "SR3 = x pointer")
+    p.ins("ADD SR4 SR0 SR0", "SR4 = count")
+    p.ins("LS SR6 SR0 1", "SR6 = elements left")
+    strip_loop_head(p, "strip")
+    p.ins("MTCL SR1")
+    p.ins("ADDVV VR1 VR0 VR0", "clear lanes beyond VL")
+    p.ins("MTCL SR2")
+    p.ins("LV VR1 SR3")
+    p.ins("SGTVS VR1 SR0", "mask of x > 0")
+    p.ins("ADDVV VR2 VR2 VR1", "masked sum")
+    p.ins("POP SR5")
+    p.ins("ADD SR4 SR4 SR5", "count positives")
+    p.ins("CVM")
+    p.ins("ADD SR3 SR3 SR2")
+    strip_loop_tail(p, "strip")
+    reduce_vector(p, "VR2", 4, "reduce")
+    p.ins("LS SR3 SR0 3")
+    p.ins("SV VR2 SR3", "store sum")
+    p.ins("ADDVS VR3 VR0 SR4")
+    p.ins("ADD SR3 SR3 SR2")
+    p.ins("SV VR3 SR3", "store count")
+    clear_scratch(p, 4)
+    p.ins("HALT")
+
+    positives = [v for v in x if v > 0]
+    wl.finish_expected({out_base: sum(positives), out_base + 1: len(positives)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VMIPS workload generator")
+    parser.add_argument("kernel", choices=["matmul", "strided", "gather", "conv", "reduce"])
+    parser.add_argument("--outdir", required=True, type=str, help="Folder to write the test into")
+    parser.add_argument("--seed", default=0, type=int, help="Seed of the random input data")
+    parser.add_argument("--n", default=64, type=int, help="matmul: rows of A and C")
+    parser.add_argument("--m", default=64, type=int, help="matmul: columns of B and C")
+    parser.add_argument("--k", default=64, type=int, help="matmul: columns of A, rows of B")
+    parser.add_argument("--length", default=4096, type=int, help="strided, gather, conv, reduce: vector length")
+    parser.add_argument("--stride", default=4, type=int, help="strided: stride in words")
+    parser.add_argument("--table", default=4096, type=int, help="gather: size of the gathered table")
+    parser.add_argument("--taps", default=9, type=int, help="conv: number of filter taps")
+    parser.add_argument("--mvl", default=MVL, type=int, help="Max vector length, a power of 2")
+    args = parser.parse_args()
+    if args.mvl & (args.mvl - 1):
+        parser.error("--mvl must be a power of 2")
+    MVL = args.mvl
+
+    wl = Workload(args.seed)
+    if args.kernel == "matmul":
+        gen_matmul(wl, args.n, args.m, args.k)
+    elif args.kernel == "strided":
+        gen_strided(wl, args.length, args.stride)
+    elif args.kernel == "gather":
+        gen_gather(wl, args.length, args.table)
+    elif args.kernel == "conv":
+        gen_conv(wl, args.length, args.taps)
+    else:
+        gen_reduce(wl, args.length)
+    wl.write(args.outdir)
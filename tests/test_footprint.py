@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONAL_DIR = os.path.join(TESTS_DIR, "..", "functional_sim")
+# An address above the small ints Python preallocates
+VDMEM_ADDRESS = 2 ** 16
+
+
+class FunctionalFootprintTest(unittest.TestCase):
+    # Runs the functional simulator with --mem-footprint on the same kernel
+    # at two lengths. The simulators are run from their folder, as scripts.
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def addresses(self, length):
+        # Addresses of the vector loads and stores in the trace, the values
+        # with more than one element
+        count = 0
+        with open(os.path.join(self.tmpdir, f"strided_{length}", "trace.txt"), "r") as tf:
+            for line in tf:
+                value = line.rpartition("(")[2]
+                if "," in value:
+                    count += value.count(",") + 1
+        return count
+
+    def peaks(self, length):
+        iodir = os.path.join(self.tmpdir, f"strided_{length}")
+        subprocess.run(
+            [sys.executable, os.path.join(TESTS_DIR, "generate.py"), "strided", "--outdir", iodir, "--length", str(length)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            [sys.executable, "mdu2004_vps4038_funcsimulator.py", "--iodir", iodir, "--trace", "--mem-footprint"],
+            cwd=FUNCTIONAL_DIR, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(os.path.join(iodir, "footprint.json"), "r") as ff:
+            return json.load(ff)["peak"]
+
+    def test_trace_share_grows_with_trace_length(self):
+        short = self.peaks(1024)
+        long = self.peaks(8192)
+        # 8 times the instructions, the trace holds their addresses
+        self.assertGreater(long["trace"], 4 * short["trace"])
+        self.assertGreater(long["trace"] / sum(long.values()), short["trace"] / sum(short.values()))
+        # The trace holds its addresses, a list slot and an int each
+        self.assertGreater(long["trace"], self.addresses(8192) * (8 + sys.getsizeof(VDMEM_ADDRESS)))
+
+
+if __name__ == "__main__":
+    unittest.main()
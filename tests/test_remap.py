@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# The timing simulator modules are imported from its folder
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "timing_sim"))
+
+from core import Config
+from cache import ResultCache
+from remap import Remap, run_remaps
+
+# Run from the repository root: python -m pytest tests
+TEST_DIR = os.path.join(TESTS_DIR, "dot_prod")
+
+
+class RemapCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.iodir = os.path.join(self.tmpdir, "dot_prod")
+        shutil.copytree(TEST_DIR, self.iodir)
+        self.cache = ResultCache(os.path.join(self.tmpdir, "cache"))
+        self.tracehash = ResultCache.hash_trace(os.path.join(self.iodir, "trace.txt"))
+        self.config = Config(self.iodir)
+        self.table = os.path.join(self.tmpdir, "table.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def remap_cycles(self, cache):
+        results = run_remaps([f"table:{self.table}"], self.config, self.iodir, cache=cache, tracehash=self.tracehash)
+        return results[1][1]["cycles"]
+
+    def test_table_edit_misses_cache(self):
+        with open(self.table, "w") as tf:
+            tf.write("0 64 1\n")
+        first = self.remap_cycles(self.cache)
+        self.assertEqual(self.remap_cycles(self.cache), first)
+
+        # Same file name, new layout: the cached result must not be returned
+        with open(self.table, "w") as tf:
+            tf.write("0 1024 5\n")
+        expected = self.remap_cycles(None)
+        self.assertNotEqual(expected, first)
+        self.assertEqual(self.remap_cycles(self.cache), expected)
+
+
+class RemapRuleTest(unittest.TestCase):
+    def test_xor_shift_below_bank_bits_rejected(self):
+        with self.assertRaises(Exception):
+            Remap("xor:2", 16)
+        self.assertEqual(Remap("xor:4", 16).address(0x35), 0x36)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import json
+import hashlib
+
+from core import SIM_VERSION
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vmips_timing")
+
+
+class ResultCache(object):
+    # Local on-disk cache of timing results.
+    # Entries are keyed by the trace content, the config parameters, the
+    # engine and the simulator version, and stored one JSON file per key.
+    # The cache is bounded to `max_entries`, least recently used are evicted first.
+    def __init__(self, cachedir=DEFAULT_CACHE_DIR, max_entries=1024):
+        self.cachedir = os.path.abspath(cachedir)
+        self.max_entries = max_entries
+        os.makedirs(self.cachedir, exist_ok=True)
+
+    @staticmethod
+    def hash_trace(tracepath):
+        # Content hash of the trace file
+        h = hashlib.sha256()
+        with open(tracepath, "rb") as tf:
+            for chunk in iter(lambda: tf.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def key(tracehash, config, engine="python"):
+        h = hashlib.sha256()
+        h.update(SIM_VERSION.encode())
+        h.update(engine.encode())
+        h.update(tracehash.encode())
+        h.update(json.dumps(config.parameters, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cachedir, key + ".json")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, "r") as ef:
+                result = json.load(ef)
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so it is the most recently used
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        path = self.entry_path(key)
+        # Write to a temp file first so concurrent runs never see partial entries
+        tmppath = f"{path}.{os.getpid()}.tmp"
+        with open(tmppath, "w") as ef:
+            json.dump(result, ef)
+        os.replace(tmppath, path)
+        self.evict()
+
+    def evict(self):
+        entries = [
+            os.path.join(self.cachedir, f)
+            for f in os.listdir(self.cachedir)
+            if f.endswith(".json")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Already evicted by a concurrent run
+                pass
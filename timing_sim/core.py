@@ -1,8 +1,12 @@
 import os
+import copy
+import hashlib
 from collections import deque
 from math import ceil
 
 from itrace import Reg
+from timeline import Timeline
+from observer import hook, CyclewiseLog
 
 VEC_DATA_OPS = {"LV", "LVWS", "LVI", "SV", "SVWS", "SVI"}
 VEC_COMPUTE_OPS = {"ADDVS", "SUBVS", "MULVS", "DIVVS", "ADDVV", "SUBVV", "MULVV", "DIVVV", "SEQVV", "SNEVV", "SGTVV", "SLTVV", "SGEVV", "SLEVV", "SEQVS", "SNEVS", "SGTVS", "SLTVS", "SGEVS", "SLEVS"}
@@ -12,11 +16,52 @@ VMR_SCALAR_OPS = {"CVM", "POP"}
 VLR_SCALAR_OPS = {"MTCL", "MFCL"}
 SCALAR_DST_OPS = {"ADD", "SUB", "AND", "OR", "XOR", "LS", "SLL", "SRL", "SRA", "MFCL", "POP"}
 BRANCH_OPS = {"BGT", "BGE", "BLE", "BLT", "BEQ", "BNE"}
+# VMR and VLR are the last two SRF busyboard entries, after the scalar
+# registers, so decoded entries do not depend on the register count
+VMR_ENTRY = -2
+VLR_ENTRY = -1
+# Config parameters which size architectural state, fixed during a run
+ARCH_PARAMS = ("maxVectorLength", "numScalarRegs", "numVectorRegs")
+
+# Sources of the timing model. Cached results and snapshots are keyed on a
+# hash of them, so any change to the model invalidates them.
+MODEL_SOURCES = ("core.py", "itrace.py", "jitcore.py", "remap.py")
+
+def model_version():
+    h = hashlib.sha256()
+    for name in MODEL_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as sf:
+            h.update(sf.read())
+    return h.hexdigest()
+
+SIM_VERSION = model_version()
+
+def compute_cycles(config, ins):
+    # Cycles a vector compute instruction occupies its unit
+    lanes = config.numLanes
+    if ins.opcode.startswith("MUL"):
+        pdepth = config.pipelineDepthMul
+    elif ins.opcode.startswith("DIV"):
+        pdepth = config.pipelineDepthDiv
+    else:
+        pdepth = config.pipelineDepthAdd
+    veclen = ins.value if ins.value is not None else config.maxVectorLength
+    return pdepth - 1 + ceil(veclen / lanes)
 
 class Config(dict):
+    # Architecture parameters which may be left out of Config.txt,
+    # the defaults are the original VMIPS design
+    DEFAULTS = {
+        "maxVectorLength": 64,
+        "numScalarRegs": 8,
+        "numVectorRegs": 8,
+    }
+
     def __init__(self, iodir):
         self.filepath = os.path.abspath(os.path.join(iodir, "Config.txt"))
         self.parameters = {} # dictionary of parameter name: value as strings.
+        for key, val in Config.DEFAULTS.items():
+            setattr(self, key, val)
 
         try:
             with open(self.filepath, 'r') as conf:
@@ -35,16 +80,54 @@ class Config(dict):
             print("Config - ERROR: Couldn't open file in path:", self.filepath)
             raise
 
-class Core:
-    MVL = 64  # Max vector length
+    def override(self, params):
+        # Copy of this config with the given parameters replaced
+        conf = copy.copy(self)
+        conf.parameters = dict(self.parameters)
+        for key, val in params.items():
+            conf.parameters[key] = int(val)
+            setattr(conf, key, int(val))
+        return conf
 
-    def __init__(self, itrace, config, iodir, cyclewise=False):
+class Core:
+    # Pipeline state, what snapshots, forks and the quanta of a multi-core run
+    # save and restore, see incremental.core_state. A new pipeline attribute
+    # must be listed here, or it is left out of them.
+    STATE = (
+        "count", "cycle", "halted",
+        "srf_busyboard", "vrf_busyboard",
+        "decode_ins", "decode_free",
+        "vec_data_q", "vec_compute_q", "dispatch_scalar_ins", "dispatch_scalar_free",
+        "mem_ins", "mem_free", "mem_cycles_left",
+        "mem_addrs", "addr_next", "lane_heads", "lane_pipes", "pipe_head", "bank_busyboard", "addrs_remaining",
+        "mul_ins", "mul_free", "mul_cycles_left",
+        "div_ins", "div_free", "div_cycles_left",
+        "add_ins", "add_free", "add_cycles_left",
+        "scalar_ins", "scalar_free",
+    )
+
+    def __init__(self, itrace, config, iodir, cyclewise=False, timeline=False, progress=None, snapshots=None, observers=(), remap=None):
         self.ITrace = itrace
         self.config = config
+        # Address remapping of vector loads and stores, see remap.py
+        self.remap = remap
+        # Per instruction stage cycles
+        self.timeline = Timeline() if timeline else None
+        # The cyclewise log, timeline, progress reporting and the snapshots of
+        # incremental runs are observers like any other, see observer.py
+        self.observers = []
         if cyclewise:
-            self.cyclewise = open(os.path.join(iodir, "cyclewise.log"), "w")
-        else:
-            self.cyclewise = None
+            self.observers.append(CyclewiseLog(os.path.join(iodir, "cyclewise.log")))
+        self.observers.extend(obs for obs in (self.timeline, progress, snapshots) if obs is not None)
+        self.observers.extend(observers)
+        self.on_fetched = hook(self.observers, "fetched")
+        self.on_decoded = hook(self.observers, "decoded")
+        self.on_dispatched = hook(self.observers, "dispatched")
+        self.on_stalled = hook(self.observers, "stalled")
+        self.on_completed = hook(self.observers, "completed")
+        self.on_stage = hook(self.observers, "stage")
+        self.on_tick = hook(self.observers, "tick")
+        self.on_finish = hook(self.observers, "finish")
 
 
 
@@ -54,9 +137,9 @@ class Core:
         self.halted = False
 
         # Decode BusyBoard, True means free, False means busy
-        # 8 registers + VMR, VLR for SRF
-        self.srf_busyboard = [True for _ in range(10)]
-        self.vrf_busyboard = [True for _ in range(8)]
+        # scalar registers + VMR, VLR for SRF
+        self.srf_busyboard = [True for _ in range(self.config.numScalarRegs + 2)]
+        self.vrf_busyboard = [True for _ in range(self.config.numVectorRegs)]
 
         # Fetch to Decode 
         self.decode_ins = None
@@ -77,8 +160,17 @@ class Core:
         bankwait = self.config.vdmBankWait
         lanes = self.config.numLanes
 
-        self.addr_queues = None
-        self.lane_pipes = [[None for _ in range(self.config.vlsPipelineDepth)] for _ in range(lanes)]
+        # Addresses of the instruction in the LS unit, lane i takes
+        # mem_addrs[i::lanes] and addr_next[i] is the next one it will take
+        self.mem_addrs = []
+        self.addr_next = [0 for _ in range(lanes)]
+        # Stage 0 of every lane, holds the address waiting for its bank
+        self.lane_heads = [None for _ in range(lanes)]
+        # Stages 1 .. depth-1 of every lane as ring buffers sharing one head index.
+        # Stage k of lane i is lane_pipes[i][(pipe_head + k - 1) % (depth - 1)],
+        # so advancing all lanes by one stage is a single head decrement.
+        self.lane_pipes = [[None for _ in range(self.config.vlsPipelineDepth - 1)] for _ in range(lanes)]
+        self.pipe_head = 0
         self.bank_busyboard = [True for _ in range(banks)]
         self.addrs_remaining = 0
 
@@ -95,39 +187,114 @@ class Core:
         self.scalar_ins = None
         self.scalar_free = True
 
-    def logcycle(self, *args):
-        if self.cyclewise:
-            print(*args, file=self.cyclewise)
-
     def run(self):
-        stop = False
-        while not stop:
-            self.logcycle("===== cycle", self.cycle)
-            self.backend_stage()
-
-            # Try all three but only do one per cycle
-            # Arbitration priority is fixed, first data, then compute, then scalar
-            if not self.dispatch_vec_data():
-                if not self.dispatch_vec_compute():
-                    self.dispatch_scalar()
+        while not self.done():
+            self.step()
 
-            self.decode_stage()
+        if self.on_finish is not None:
+            self.on_finish(self)
 
-            self.fetch_stage()
-
-            # Increment cycle
-            self.cycle += 1
-
-            # Check if all stages are empty
-            stop = self.halted and self.mul_free and self.div_free and self.add_free \
-                    and self.scalar_free and self.mem_free and self.dispatch_scalar_free \
-                    and (len(self.vec_data_q) == 0) and (len(self.vec_compute_q) == 0) \
-                    and self.decode_free
+        return self.cycle
 
-        if self.cyclewise:
-            self.cyclewise.close()
+    def step(self):
+        # Simulate one cycle
+        if self.on_stage is not None:
+            self.on_stage("===== cycle", self.cycle)
+        self.backend_stage()
+
+        # Try all three but only do one per cycle
+        # Arbitration priority is fixed, first data, then compute, then scalar
+        if not self.dispatch_vec_data():
+            if not self.dispatch_vec_compute():
+                self.dispatch_scalar()
+            elif self.on_stalled is not None:
+                self.stalled_not_dispatched(compute=False)
+        elif self.on_stalled is not None:
+            self.stalled_not_dispatched(compute=True)
+
+        self.decode_stage()
+
+        self.fetch_stage()
+
+        # Increment cycle
+        self.cycle += 1
+
+        if self.on_tick is not None:
+            self.on_tick(self)
+
+    def stalled_not_dispatched(self, compute):
+        # Charge the stall of the queue heads which were not tried for
+        # dispatch because a higher priority queue dispatched this cycle
+        if compute and len(self.vec_compute_q) > 0:
+            ins = self.vec_compute_q[0]
+            if ins.opcode.startswith("MUL"):
+                free = self.mul_free
+            elif ins.opcode.startswith("DIV"):
+                free = self.div_free
+            else:
+                free = self.add_free
+            self.on_stalled(ins, "arbitration" if free else "unit_busy")
+        if not self.dispatch_scalar_free:
+            self.on_stalled(self.dispatch_scalar_ins, "arbitration" if self.scalar_free else "unit_busy")
+
+    def done(self):
+        # Check if all stages are empty
+        return self.halted and self.mul_free and self.div_free and self.add_free \
+                and self.scalar_free and self.mem_free and self.dispatch_scalar_free \
+                and (len(self.vec_data_q) == 0) and (len(self.vec_compute_q) == 0) \
+                and self.decode_free
+
+    def counters(self):
+        # Summary counters of a finished run
+        return {"cycles": self.cycle, "instructions": self.count}
+
+    def reconfigure(self, config):
+        # Continue the run with another config from the current cycle on, e.g.
+        # in a fork of a snapshot, see fork.py. Queue depths, pipeline depths
+        # and the bank wait apply to what is decoded, dispatched or enters a
+        # lane from now on, units busy keep the cycles they were given.
+        old = self.config
+        for key in ARCH_PARAMS:
+            if getattr(config, key) != getattr(old, key):
+                raise Exception(f"Core - ERROR: {key} is architectural, it can not change during a run")
+        self.config = config
+        lanes, new_lanes = old.numLanes, config.numLanes
+        ring, new_ring = old.vlsPipelineDepth - 1, config.vlsPipelineDepth - 1
 
-        return self.cycle
+        if new_lanes != lanes:
+            # Deal the addresses no lane took yet out to the new lanes,
+            # the way dispatch_vec_data does
+            pending = []
+            for i in range(lanes):
+                first = self.addr_next[i] - lanes if self.lane_heads[i] is not None else self.addr_next[i]
+                pending.extend(range(first, len(self.mem_addrs), lanes))
+            pending.sort()
+            self.mem_addrs = [self.mem_addrs[j] for j in pending]
+            self.lane_heads = [self.mem_addrs[i] if i < len(pending) else None for i in range(new_lanes)]
+            self.addr_next = [i + new_lanes if i < len(pending) else i for i in range(new_lanes)]
+
+        if new_lanes != lanes or new_ring != ring:
+            # Stages of every lane, stage 1 first. Addresses in the stages past
+            # the new depth or in lanes removed complete in this cycle.
+            stages = [[pipe[(self.pipe_head + k) % ring] for k in range(ring)] for pipe in self.lane_pipes]
+            stages += [[] for _ in range(new_lanes - lanes)]
+            pipes = [(lane + [None] * new_ring)[:new_ring] for lane in stages[:new_lanes]]
+            kept = sum(addr is not None for pipe in pipes for addr in pipe)
+            self.addrs_remaining -= sum(addr is not None for lane in stages for addr in lane) - kept
+            self.lane_pipes = pipes
+            self.pipe_head = 0
+
+        if (new_lanes, new_ring, config.vdmNumBanks, config.vdmBankWait) != (
+            lanes, ring, old.vdmNumBanks, old.vdmBankWait
+        ):
+            # The banks of the addresses in stages 1 .. bank wait are held
+            banks = config.vdmNumBanks
+            self.bank_busyboard = [True for _ in range(banks)]
+            for pipe in self.lane_pipes:
+                for k in range(config.vdmBankWait):
+                    addr = pipe[(self.pipe_head + k) % new_ring]
+                    if addr is not None:
+                        self.bank_busyboard[addr % banks] = False
 
     def fetch_stage(self):
         if self.decode_free and not self.halted:
@@ -135,71 +302,96 @@ class Core:
             self.decode_ins = self.ITrace.Read(self.count)
             self.decode_free = False
             self.count += 1 
-            self.logcycle("  fetch:", self.decode_ins)
+            if self.on_stage is not None:
+                self.on_stage("  fetch:", self.decode_ins)
+            if self.on_fetched is not None:
+                self.on_fetched(self.decode_ins, self.cycle)
             if self.decode_ins.opcode == "HALT":
                 self.halted = True
 
-    def check_busyboard(self, ins):
-        # Check if instruction operands are free in the busyboard
-        free = True
+    @staticmethod
+    def decode_busyboard(ins):
+        # Busyboard entries read and written by the instruction.
+        # Computed once and cached on the instruction, so cores sharing
+        # a trace decode every instruction only once.
+        if ins.busy is not None:
+            return ins.busy
+
+        check_srf = []
+        check_vrf = []
+        mark_srf = []
+        mark_vrf = []
         for op in ins.ops:
             if type(op) is not Reg:
                 continue
-            free = free and (((op.ty == Reg.SCALAR) and self.srf_busyboard[op.idx])
-                    or ((op.ty == Reg.VECTOR) and self.vrf_busyboard[op.idx]))
+            if op.ty == Reg.SCALAR:
+                check_srf.append(op.idx)
+            else:
+                check_vrf.append(op.idx)
+                mark_vrf.append(op.idx)
+            # Scalar reg marked below only for destination
 
         if ins.opcode in VMR_SCALAR_OPS or ins.opcode in VEC_OPS:
-            free = free and self.srf_busyboard[8]
+            check_srf.append(VMR_ENTRY)
         if ins.opcode in VLR_SCALAR_OPS or ins.opcode in VEC_OPS:
-            free = free and self.srf_busyboard[9]
-        return free
+            check_srf.append(VLR_ENTRY)
 
-    def mark_busyboard(self, ins):
-        # Mark instruction operands as busy
-        for op in ins.ops:
-            if type(op) is not Reg:
-                continue
-            if op.ty == Reg.VECTOR:
-                self.vrf_busyboard[op.idx] = False
-            # Scalar reg checked below only for destination
         if ins.opcode == 'CVM' or ins.opcode in VEC_MASK_OPS:
             # Writes to VMR
-            self.srf_busyboard[8] = False
+            mark_srf.append(VMR_ENTRY)
         if ins.opcode == 'MTCL':
             # Writes to VLR
-            self.srf_busyboard[9] = False
+            mark_srf.append(VLR_ENTRY)
         if ins.opcode in SCALAR_DST_OPS:
             # Only destination scalar regs are marked busy.
             # Source regs are passed along with the ins at decode
             # so no need to mark busy.
-            self.srf_busyboard[ins.op(0).idx] = False
+            mark_srf.append(ins.op(0).idx)
+
+        ins.busy = (tuple(check_srf), tuple(check_vrf), tuple(mark_srf), tuple(mark_vrf))
+        return ins.busy
+
+    def check_busyboard(self, ins):
+        # Check if instruction operands are free in the busyboard
+        check_srf, check_vrf, _, _ = Core.decode_busyboard(ins)
+        srf_busyboard = self.srf_busyboard
+        vrf_busyboard = self.vrf_busyboard
+        for idx in check_srf:
+            if not srf_busyboard[idx]:
+                return False
+        for idx in check_vrf:
+            if not vrf_busyboard[idx]:
+                return False
+        return True
+
+    def mark_busyboard(self, ins):
+        # Mark instruction operands as busy
+        _, _, mark_srf, mark_vrf = Core.decode_busyboard(ins)
+        for idx in mark_srf:
+            self.srf_busyboard[idx] = False
+        for idx in mark_vrf:
+            self.vrf_busyboard[idx] = False
 
     def unmark_busyboard(self, ins):
         # Mark instruction operands as free
-        for op in ins.ops:
-            if type(op) is not Reg:
-                continue
-            if op.ty == Reg.VECTOR:
-                self.vrf_busyboard[op.idx] = True
-        if ins.opcode == 'CVM' or ins.opcode in VEC_MASK_OPS:
-            # VMR
-            self.srf_busyboard[8] = True
-        if ins.opcode == 'MTCL':
-            # VLR
-            self.srf_busyboard[9] = True
-        if ins.opcode in SCALAR_DST_OPS:
-            self.srf_busyboard[ins.op(0).idx] = True
-
+        _, _, mark_srf, mark_vrf = Core.decode_busyboard(ins)
+        for idx in mark_srf:
+            self.srf_busyboard[idx] = True
+        for idx in mark_vrf:
+            self.vrf_busyboard[idx] = True
 
     def decode_stage(self):
         if self.decode_free:
             return
 
         ins = self.decode_ins
-        self.logcycle("  decode:", ins)
+        if self.on_stage is not None:
+            self.on_stage("  decode:", ins)
         if ins.opcode not in BRANCH_OPS and not self.check_busyboard(ins):
             # Wait for instruction ops to be free
             # Do not check for branch as they are already resolved
+            if self.on_stalled is not None:
+                self.on_stalled(ins, "raw")
             return
 
         if ins.opcode in VEC_DATA_OPS:
@@ -210,6 +402,10 @@ class Core:
                 self.decode_ins = None
                 self.decode_free = True
                 self.mark_busyboard(ins)
+                if self.on_decoded is not None:
+                    self.on_decoded(ins, self.cycle)
+            elif self.on_stalled is not None:
+                self.on_stalled(ins, "queue_full")
         elif ins.opcode in VEC_COMPUTE_OPS:
             if len(self.vec_compute_q) < self.config.computeQueueDepth:
                 # Pass on instruction to dispatch
@@ -218,6 +414,10 @@ class Core:
                 self.decode_ins = None
                 self.decode_free = True
                 self.mark_busyboard(ins)
+                if self.on_decoded is not None:
+                    self.on_decoded(ins, self.cycle)
+            elif self.on_stalled is not None:
+                self.on_stalled(ins, "queue_full")
         else:
             if self.dispatch_scalar_free:
                 self.dispatch_scalar_ins = ins
@@ -226,17 +426,23 @@ class Core:
                 self.decode_ins = None
                 self.decode_free = True
                 self.mark_busyboard(ins)
-
+                if self.on_decoded is not None:
+                    self.on_decoded(ins, self.cycle)
+            elif self.on_stalled is not None:
+                self.on_stalled(ins, "queue_full")
 
     def dispatch_vec_data(self):
         if len(self.vec_data_q) == 0:
             return False
         vmem_ins = self.vec_data_q[0]
-        self.logcycle("  dispatch vmem:", vmem_ins)
+        if self.on_stage is not None:
+            self.on_stage("  dispatch vmem:", vmem_ins)
         if self.mem_free:
             self.mem_ins = vmem_ins
             self.mem_free = False
             self.vec_data_q.popleft()
+            if self.on_dispatched is not None:
+                self.on_dispatched(vmem_ins, self.cycle, "mem")
 
             if vmem_ins.value is None:
                 raise Exception(f"Memory instruction {vmem_ins} does not have addresses")
@@ -244,27 +450,26 @@ class Core:
                 addrs = [vmem_ins.value]
             else:
                 addrs = vmem_ins.value
+            if self.remap is not None:
+                addrs = self.remap(addrs)
 
             lanes = self.config.numLanes
-            self.addr_queues = [deque(addrs[i::lanes]) for i in range(lanes)]
+            self.mem_addrs = addrs
             self.addrs_remaining = len(addrs)
             for i in range(lanes):
-                if len(self.addr_queues[i]) > 0:
-                    self.lane_pipes[i][0] = self.addr_queues[i].popleft()
+                if i < len(addrs):
+                    self.lane_heads[i] = addrs[i]
+                    self.addr_next[i] = i + lanes
+                else:
+                    self.addr_next[i] = i
 
             return True
+        if self.on_stalled is not None:
+            self.on_stalled(vmem_ins, "unit_busy")
         return False
 
     def get_compute_cycles(self, ins):
-        lanes = self.config.numLanes
-        if ins.opcode.startswith("MUL"):
-            pdepth = self.config.pipelineDepthMul
-        elif ins.opcode.startswith("DIV"):
-            pdepth = self.config.pipelineDepthDiv
-        else:
-            pdepth = self.config.pipelineDepthAdd
-        veclen = ins.value if ins.value is not None else Core.MVL
-        return pdepth - 1 + ceil(veclen / lanes)
+        return compute_cycles(self.config, ins)
 
     def dispatch_vec_compute(self):
         pMul = self.config.pipelineDepthMul
@@ -274,13 +479,16 @@ class Core:
         if len(self.vec_compute_q) == 0:
             return False
         vcomp_ins = self.vec_compute_q[0]
-        self.logcycle("  dispatch vcomp:", vcomp_ins)
+        if self.on_stage is not None:
+            self.on_stage("  dispatch vcomp:", vcomp_ins)
         if vcomp_ins.opcode.startswith("MUL"):
             if self.mul_free:
                 self.mul_ins = vcomp_ins
                 self.mul_free = False
                 self.mul_cycles_left = self.get_compute_cycles(vcomp_ins)
                 self.vec_compute_q.popleft()
+                if self.on_dispatched is not None:
+                    self.on_dispatched(vcomp_ins, self.cycle, "mul")
                 return True
         elif vcomp_ins.opcode.startswith("DIV"):
             if self.div_free:
@@ -288,6 +496,8 @@ class Core:
                 self.div_free = False
                 self.div_cycles_left = self.get_compute_cycles(vcomp_ins)
                 self.vec_compute_q.popleft()
+                if self.on_dispatched is not None:
+                    self.on_dispatched(vcomp_ins, self.cycle, "div")
                 return True
         else:
             if self.add_free:
@@ -295,18 +505,27 @@ class Core:
                 self.add_free = False
                 self.add_cycles_left = self.get_compute_cycles(vcomp_ins)
                 self.vec_compute_q.popleft()
+                if self.on_dispatched is not None:
+                    self.on_dispatched(vcomp_ins, self.cycle, "add")
                 return True
+        if self.on_stalled is not None:
+            self.on_stalled(vcomp_ins, "unit_busy")
         return False
 
     def dispatch_scalar(self):
         if not self.dispatch_scalar_free:
             if self.scalar_free:
                 self.scalar_ins = self.dispatch_scalar_ins
-                self.logcycle("  dispatch scalar:", self.scalar_ins)
+                if self.on_stage is not None:
+                    self.on_stage("  dispatch scalar:", self.scalar_ins)
                 self.scalar_free = False
+                if self.on_dispatched is not None:
+                    self.on_dispatched(self.scalar_ins, self.cycle, "scalar")
                 self.dispatch_scalar_ins = None
                 self.dispatch_scalar_free = True
                 return True
+            if self.on_stalled is not None:
+                self.on_stalled(self.dispatch_scalar_ins, "unit_busy")
         return False
 
     def backend_mem(self):
@@ -315,82 +534,112 @@ class Core:
 
         banks = self.config.vdmNumBanks
         bankwait = self.config.vdmBankWait
-        pdepth = self.config.vlsPipelineDepth
         lanes = self.config.numLanes
 
-        def get_bank(addr):
-            return addr % banks
-
-        addr_queues = self.addr_queues
+        addrs = self.mem_addrs
+        num_addrs = len(addrs)
+        addr_next = self.addr_next
+        lane_heads = self.lane_heads
         lane_pipes = self.lane_pipes
         bank_busyboard = self.bank_busyboard
 
+        # Ring slots of the stages touched this cycle
+        ring = self.config.vlsPipelineDepth - 1
+        head = self.pipe_head
+        wait_slot = (head + bankwait - 1) % ring
+        # Slot of the last stage, it becomes stage 1 after advancing
+        last_slot = (head + ring - 1) % ring
+
         # Simulate the load-store pipeline
             # Advance lane pipelines
+        conflict = False
         for i in range(lanes):
-            self.logcycle("    backend mem queue:", lane_pipes[i])
+            pipe = lane_pipes[i]
+            if self.on_stage is not None:
+                self.on_stage("    backend mem queue:", [lane_heads[i]] + [pipe[(head + k) % ring] for k in range(ring)])
             # Bank access wait is over, free the busyboard 
-            if lane_pipes[i][bankwait] is not None:
-                bank_busyboard[get_bank(lane_pipes[i][bankwait])] = True
+            waddr = lane_heads[i] if bankwait == 0 else pipe[wait_slot]
+            if waddr is not None:
+                bank_busyboard[waddr % banks] = True
 
             # Addr processed
-            if lane_pipes[i][-1] is not None:
+            if pipe[last_slot] is not None:
                 self.addrs_remaining -= 1
 
-            for j in range(pdepth-2):
-                lane_pipes[i][pdepth-1-j] = lane_pipes[i][pdepth-2-j]
             # 0th can advance only if not stalled
-            addr = lane_pipes[i][0]
-            if addr is not None and bank_busyboard[get_bank(addr)]:
-                lane_pipes[i][1] = addr
-                lane_pipes[i][0] = None
-                bank_busyboard[get_bank(addr)] = False
+            addr = lane_heads[i]
+            if addr is not None and bank_busyboard[addr % banks]:
+                pipe[last_slot] = addr
+                lane_heads[i] = None
+                bank_busyboard[addr % banks] = False
             else:
                 # Insert stall
-                lane_pipes[i][1] = None
+                pipe[last_slot] = None
+                if addr is not None:
+                    conflict = True
             # Push new addrs
-            if lane_pipes[i][0] is None and len(addr_queues[i]) > 0:
-                lane_pipes[i][0] = addr_queues[i].popleft()
+            if lane_heads[i] is None and addr_next[i] < num_addrs:
+                lane_heads[i] = addrs[addr_next[i]]
+                addr_next[i] += lanes
+
+        self.pipe_head = last_slot
+        if conflict and self.on_stalled is not None:
+            self.on_stalled(self.mem_ins, "bank_conflict")
 
     def backend_stage(self):
         if not self.mem_free:
-            self.logcycle("  backend mem:", self.mem_ins)
+            if self.on_stage is not None:
+                self.on_stage("  backend mem:", self.mem_ins)
             self.backend_mem()
             if self.addrs_remaining == 0:
                 self.unmark_busyboard(self.mem_ins)
+                if self.on_completed is not None:
+                    self.on_completed(self.mem_ins, self.cycle)
                 self.mem_ins = None
                 self.mem_free = True
 
         if not self.mul_free:
-            self.logcycle("  backend mul:", self.mul_ins, "cycles", self.mul_cycles_left)
+            if self.on_stage is not None:
+                self.on_stage("  backend mul:", self.mul_ins, "cycles", self.mul_cycles_left)
             if self.mul_cycles_left == 1:
                 self.unmark_busyboard(self.mul_ins)
+                if self.on_completed is not None:
+                    self.on_completed(self.mul_ins, self.cycle)
                 self.mul_ins = None
                 self.mul_free = True
             else:
                 self.mul_cycles_left -= 1
 
         if not self.div_free:
-            self.logcycle("  backend div:", self.div_ins, "cycles", self.div_cycles_left)
+            if self.on_stage is not None:
+                self.on_stage("  backend div:", self.div_ins, "cycles", self.div_cycles_left)
             if self.div_cycles_left == 1:
                 self.unmark_busyboard(self.div_ins)
+                if self.on_completed is not None:
+                    self.on_completed(self.div_ins, self.cycle)
                 self.div_ins = None
                 self.div_free = True
             else:
                 self.div_cycles_left -= 1
 
         if not self.add_free:
-            self.logcycle("  backend add:", self.add_ins, "cycles", self.add_cycles_left)
+            if self.on_stage is not None:
+                self.on_stage("  backend add:", self.add_ins, "cycles", self.add_cycles_left)
             if self.add_cycles_left == 1:
                 self.unmark_busyboard(self.add_ins)
+                if self.on_completed is not None:
+                    self.on_completed(self.add_ins, self.cycle)
                 self.add_ins = None
                 self.add_free = True
             else:
                 self.add_cycles_left -= 1
 
         if not self.scalar_free:
-            self.logcycle("  backend scalar:", self.scalar_ins)
+            if self.on_stage is not None:
+                self.on_stage("  backend scalar:", self.scalar_ins)
             self.unmark_busyboard(self.scalar_ins)
+            if self.on_completed is not None:
+                self.on_completed(self.scalar_ins, self.cycle)
             self.scalar_ins = None
             self.scalar_free = True
 
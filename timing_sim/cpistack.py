@@ -0,0 +1,83 @@
+import os
+from collections import defaultdict
+
+from core import BRANCH_OPS
+from timeline import CPI_CAUSES
+
+
+class CPIStack(object):
+    # Cycle accounting per static instruction and per loop.
+    # Every cycle of a run is charged by the Timeline to the oldest instruction
+    # in flight, as base or as the stall cause of that cycle. Charges are summed
+    # here by static PC, and loops are the PC ranges of backward branches.
+    def __init__(self, timeline, itrace, cycles):
+        if len(timeline) > 0 and min(timeline.pc) < 0:
+            raise Exception("CPIStack - ERROR: Trace has no PC, regenerate it with the functional simulator")
+        self.cycles = cycles
+        self.idle = timeline.idle
+        self.instructions = len(timeline)
+        self.count = defaultdict(int)
+        self.charged = defaultdict(lambda: {cause: 0 for cause in CPI_CAUSES})
+        self.text = {}
+        for idx in range(len(timeline)):
+            pc = timeline.pc[idx]
+            self.count[pc] += 1
+            self.text[pc] = timeline.text(idx)
+            charged = self.charged[pc]
+            for cause in CPI_CAUSES:
+                charged[cause] += timeline.charged[cause][idx]
+
+        # Backward branches close a loop from their target to themselves
+        self.loops = []
+        for static in itrace.statics:
+            if static.opcode in BRANCH_OPS and static.pc is not None and static.ops[2] <= 0:
+                self.loops.append((static.pc + static.ops[2], static.pc))
+        self.loops.sort()
+
+    def loop_charged(self, start, end):
+        charged = {cause: 0 for cause in CPI_CAUSES}
+        for pc in range(start, end + 1):
+            if pc in self.charged:
+                for cause in CPI_CAUSES:
+                    charged[cause] += self.charged[pc][cause]
+        return charged
+
+    def report(self):
+        def share(cycles):
+            return f"{100.0 * cycles / self.cycles:5.1f}%" if self.cycles else "    -"
+
+        cpi = self.cycles / self.instructions if self.instructions else 0.0
+        lines = [f"CPI stack, {self.cycles} cycles, {self.instructions} instructions, CPI {cpi:.2f}", "Cycles by cause:"]
+        for cause in CPI_CAUSES:
+            total = sum(charged[cause] for charged in self.charged.values())
+            lines.append(f"  {cause:<14} {total:>10} {share(total)}")
+        lines.append(f"  {'idle':<14} {self.idle:>10} {share(self.idle)}")
+
+        causes = "".join(f"{cause:>14}" for cause in CPI_CAUSES)
+        lines.append("")
+        lines.append(f"{'PC':<6}{'Instruction':<24}{'Count':>8}{'Cycles':>10}{'Share':>8}{'CPI':>8}{causes}")
+        for pc in sorted(self.charged):
+            charged = self.charged[pc]
+            cycles = sum(charged.values())
+            lines.append(
+                f"{pc:<6}{self.text[pc]:<24}{self.count[pc]:>8}{cycles:>10}{share(cycles):>8}"
+                f"{cycles / self.count[pc]:>8.2f}" + "".join(f"{charged[cause]:>14}" for cause in CPI_CAUSES)
+            )
+
+        if self.loops:
+            lines.append("")
+            lines.append(f"{'Loop':<12}{'Iterations':>10}{'Cycles':>10}{'Share':>8}{causes}")
+            for start, end in self.loops:
+                charged = self.loop_charged(start, end)
+                cycles = sum(charged.values())
+                lines.append(
+                    f"{f'{start}-{end}':<12}{self.count[end]:>10}{cycles:>10}{share(cycles):>8}"
+                    + "".join(f"{charged[cause]:>14}" for cause in CPI_CAUSES)
+                )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, iodir):
+        opfilepath = os.path.abspath(os.path.join(iodir, "cpistack.txt"))
+        with open(opfilepath, "w") as opf:
+            opf.write(self.report())
+        print("CPIStack - Dumped cycle accounting into output file in path:", opfilepath)
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from collections import defaultdict
+
+from itrace import ITrace
+from core import Core, Config
+from sweep import parse_sweep
+from timeline import UNITS, STALL_CAUSES
+
+
+def run_side(iodir, configdir, overrides):
+    # Run the timing Core with a timeline and return the per instruction
+    # results as plain lists, so both sides can come from different processes
+    config = Config(configdir or iodir)
+    if overrides:
+        config = config.override(overrides)
+    vcore = Core(ITrace(iodir), config, iodir, timeline=True)
+    cycles = vcore.run()
+    tl = vcore.timeline
+    return {
+        "cycles": cycles,
+        "parameters": config.parameters,
+        "fetch": tl.fetch.tolist(),
+        "complete": tl.complete.tolist(),
+        "backend_start": tl.backend_start.tolist(),
+        "unit": tl.unit.tolist(),
+        "text": [tl.text(idx) for idx in range(len(tl))],
+        "pc": tl.pc.tolist(),
+        "stalls": {cause: tl.stalls[cause].tolist() for cause in STALL_CAUSES},
+    }
+
+
+def run_external(simdir, iodir, configdir, overrides):
+    # Run the difftiming.py of another simulator version in its own process,
+    # its modules share names with ours so it can not be imported here
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dumpfile = os.path.join(tmpdir, "side.json")
+        cmd = [sys.executable, "difftiming.py", "--iodir", os.path.abspath(iodir), "--dump", dumpfile]
+        if configdir:
+            cmd += ["--config-a", os.path.abspath(configdir)]
+        for key, val in overrides.items():
+            cmd += ["--set-a", f"{key}={val}"]
+        subprocess.run(cmd, cwd=simdir, check=True, stdout=subprocess.DEVNULL)
+        with open(dumpfile, "r") as dumpf:
+            return json.load(dumpf)
+
+
+def unit_cycles(side):
+    # Busy cycles of every backend unit
+    busy = {unit: 0 for unit in UNITS}
+    for idx, unit in enumerate(side["unit"]):
+        if unit >= 0 and side["complete"][idx] >= 0:
+            busy[UNITS[unit]] += side["complete"][idx] + 1 - side["backend_start"][idx]
+    return busy
+
+
+def compare(a, b, top=10):
+    # Report of the cycle differences of side b against side a
+    if len(a["complete"]) != len(b["complete"]):
+        raise Exception(f"DiffTiming - ERROR: Traces differ in length: {len(a['complete'])} vs {len(b['complete'])}")
+    n = len(a["complete"])
+
+    def pct(va, vb):
+        return f"{100.0 * (vb - va) / va:+6.1f}%" if va else "     -"
+
+    lines = [f"Cycles: {a['cycles']} -> {b['cycles']} ({b['cycles'] - a['cycles']:+d}, {pct(a['cycles'], b['cycles'])})"]
+    changed = {key: (a["parameters"].get(key), val) for key, val in b["parameters"].items() if a["parameters"].get(key) != val}
+    if changed:
+        lines.append("Changed parameters: " + " ".join(f"{key}={va}->{vb}" for key, (va, vb) in changed.items()))
+
+    lines.append("Stall cycles by cause:")
+    for cause in STALL_CAUSES:
+        sa, sb = sum(a["stalls"][cause]), sum(b["stalls"][cause])
+        lines.append(f"  {cause:<14} {sa:>10} {sb:>10} {sb - sa:>+10}")
+    lines.append("Unit busy cycles:")
+    busy_a, busy_b = unit_cycles(a), unit_cycles(b)
+    for unit in UNITS:
+        lines.append(f"  {unit:<14} {busy_a[unit]:>10} {busy_b[unit]:>10} {busy_b[unit] - busy_a[unit]:>+10}")
+
+    # Residence time, fetch to completion, is local to an instruction while
+    # the completion cycle also carries the delays of all older instructions
+    delta = [
+        (b["complete"][idx] - b["fetch"][idx]) - (a["complete"][idx] - a["fetch"][idx])
+        for idx in range(n)
+    ]
+
+    def stall_delta(idx):
+        return {cause: b["stalls"][cause][idx] - a["stalls"][cause][idx] for cause in STALL_CAUSES}
+
+    def causes(sdelta):
+        return " ".join(f"{cause}{d:+d}" for cause, d in sdelta.items() if d) or "-"
+
+    lines.append("Top instructions by residence delta:")
+    lines.append(f"  {'idx':>8} {'complete a':>10} {'complete b':>10} {'delta':>8}  {'instruction':<24} stall delta")
+    order = sorted(range(n), key=lambda idx: (-abs(delta[idx]), idx))[:top]
+    for idx in order:
+        if delta[idx] == 0:
+            break
+        lines.append(
+            f"  {idx:>8} {a['complete'][idx]:>10} {b['complete'][idx]:>10} {delta[idx]:>+8}  "
+            f"{a['text'][idx]:<24} {causes(stall_delta(idx))}"
+        )
+
+    # Static instructions by PC, or by text for traces without PC
+    pcs = a.get("pc", [-1] * n)
+    statics = defaultdict(lambda: [0, 0, defaultdict(int)])
+    for idx in range(n):
+        st = statics[f"{pcs[idx]}: {a['text'][idx]}" if pcs[idx] >= 0 else a["text"][idx]]
+        st[0] += 1
+        st[1] += delta[idx]
+        for cause, d in stall_delta(idx).items():
+            st[2][cause] += d
+    lines.append("Top static instructions by summed residence delta:")
+    lines.append(f"  {'count':>8} {'delta':>10}  {'pc: instruction':<24} stall delta")
+    order = sorted(statics.items(), key=lambda kv: (-abs(kv[1][1]), kv[0]))[:top]
+    for text, (count, sdelta, scauses) in order:
+        if sdelta == 0:
+            break
+        lines.append(f"  {count:>8} {sdelta:>+10}  {text:<24} {causes(scauses)}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per instruction timing differences between two configs or simulator versions")
+    parser.add_argument("--iodir", default="", type=str, help="Path to the folder containing the trace and Config.txt")
+    parser.add_argument("--config-a", default=None, type=str, help="Folder with the Config.txt of side a, default iodir")
+    parser.add_argument("--config-b", default=None, type=str, help="Folder with the Config.txt of side b, default config-a")
+    parser.add_argument("--set-a", default=[], action="append", help="Override a parameter of side a, e.g. numLanes=4")
+    parser.add_argument("--set-b", default=[], action="append", help="Override a parameter of side b, e.g. numLanes=8")
+    parser.add_argument("--sim-b", default=None, type=str, help="timing_sim folder of another simulator version for side b")
+    parser.add_argument("--top", default=10, type=int, help="Number of instructions to report")
+    parser.add_argument("--dump", default=None, type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    iodir = os.path.abspath(args.iodir)
+    # parse_sweep gives a single point for single valued overrides
+    set_a = parse_sweep(args.set_a)[0] if args.set_a else {}
+    set_b = parse_sweep(args.set_b)[0] if args.set_b else {}
+
+    if args.dump:
+        # Side run requested by another version of this tool
+        with open(args.dump, "w") as dumpf:
+            json.dump(run_side(iodir, args.config_a, set_a), dumpf)
+        exit(0)
+
+    side_a = run_side(iodir, args.config_a, set_a)
+    configdir_b = args.config_b or args.config_a
+    if args.sim_b:
+        side_b = run_external(args.sim_b, iodir, configdir_b, set_b)
+    else:
+        side_b = run_side(iodir, configdir_b, set_b)
+    print(compare(side_a, side_b, args.top))
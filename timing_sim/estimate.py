@@ -0,0 +1,239 @@
+import os
+import sys
+from collections import deque
+
+from itrace import ITrace
+from core import Core, Config, compute_cycles, VEC_DATA_OPS, VEC_COMPUTE_OPS, BRANCH_OPS
+
+# Categories of the critical path breakdown
+PATH_CATEGORIES = [
+    "frontend",      # in-order fetch and decode
+    "dispatch",      # decode to dispatch, in-order dispatch from the queues
+    "scalar",        # scalar unit execution
+    "compute",       # vector compute unit execution
+    "memory",        # vector load-store without bank conflicts
+    "bank_conflict", # extra load-store cycles due to bank conflicts
+]
+# Stall causes counted over all instructions
+STALL_CAUSES = ["raw", "queue_full", "unit_busy"]
+
+
+class Estimator(object):
+    # Analytic cycle estimate of a trace under a config.
+    # Walks the trace once and computes for every instruction the cycle it
+    # leaves decode, is dispatched and completes, from the completion of
+    # the instructions it depends on (busyboard entries, queue slots, units).
+    # There is no per-cycle loop, so the cost is linear in trace length.
+    # Every time keeps the constraint which set it, so the critical path can
+    # be walked back from the last completing instruction.
+    def __init__(self, itrace, config):
+        self.ITrace = itrace
+        self.config = config
+        self.cycles = 0
+        self.path = {cat: 0 for cat in PATH_CATEGORIES}
+        self.stalls = {cause: 0 for cause in STALL_CAUSES}
+        # Per instruction cycles on the critical path, by idx
+        self.path_ins = {}
+
+    def mem_cycles(self, ins, start):
+        # Replay the addresses through the lanes in issue order.
+        # Each lane issues one address per cycle if its bank is free,
+        # the bank stays busy for vdmBankWait cycles.
+        # Returns the completion cycle and the conflict free completion cycle.
+        lanes = self.config.numLanes
+        banks = self.config.vdmNumBanks
+        bankwait = self.config.vdmBankWait
+        pdepth = self.config.vlsPipelineDepth
+
+        addrs = ins.value if type(ins.value) is list else [ins.value]
+        lane_ready = [start for _ in range(lanes)]
+        bank_free = {}
+        last = start
+        for j, addr in enumerate(addrs):
+            lane = j % lanes
+            bank = addr % banks
+            t = max(lane_ready[lane], bank_free.get(bank, start))
+            bank_free[bank] = t + bankwait
+            lane_ready[lane] = t + 1
+            last = max(last, t)
+        ideal = start + (len(addrs) - 1) // lanes
+        return last + pdepth - 1, ideal + pdepth - 1
+
+    def run(self):
+        config = self.config
+        # Ready cycle of every busyboard entry, as in the timing Core
+        # as (cycle, idx of the instruction freeing it, cycle)
+        srf_ready = [(0, -1, 0) for _ in range(config.numScalarRegs + 2)]
+        vrf_ready = [(0, -1, 0) for _ in range(config.numVectorRegs)]
+        # Dispatch cycles of the instructions in each queue
+        data_q = deque(maxlen=config.dataQueueDepth)
+        compute_q = deque(maxlen=config.computeQueueDepth)
+        # Free cycle of each backend unit
+        unit_free = {unit: (0, -1, 0) for unit in ("mem", "mul", "div", "add", "scalar")}
+        # Last dispatch cycle of each queue, and (idx, cycle) of that instruction
+        last_dispatch = {"data": -1, "compute": -1, "scalar": -1}
+        last_dispatch.update({"data_src": (-1, -1), "compute_src": (-1, -1), "scalar_src": (-1, -1)})
+        dispatch_used = set()
+
+        # Per instruction: (decode leave, dispatch, completion, exec category,
+        # bank conflict cycles). Decode leave and dispatch are (cycle, constraint),
+        # a constraint is (category, idx of the instruction, cycle of that node).
+        timing = []
+        decode_leave = -1
+        idx = 0
+        while True:
+            ins = self.ITrace.Read(idx)
+            fetch = decode_leave if idx > 0 else 0
+
+            # Leave decode when operands are free and there is space downstream
+            leave = (fetch + 1, ("frontend", idx - 1, fetch))
+            check_srf, check_vrf, mark_srf, mark_vrf = Core.decode_busyboard(ins)
+            if ins.opcode not in BRANCH_OPS:
+                for entry in check_srf:
+                    if srf_ready[entry][0] > leave[0]:
+                        leave = (srf_ready[entry][0], ("raw",) + srf_ready[entry][1:])
+                for entry in check_vrf:
+                    if vrf_ready[entry][0] > leave[0]:
+                        leave = (vrf_ready[entry][0], ("raw",) + vrf_ready[entry][1:])
+            if ins.opcode in VEC_DATA_OPS:
+                queue, qname, unit = data_q, "data", "mem"
+            elif ins.opcode in VEC_COMPUTE_OPS:
+                queue, qname = compute_q, "compute"
+                unit = ins.opcode[:3].lower()
+                unit = unit if unit in ("mul", "div") else "add"
+            else:
+                queue, qname, unit = None, "scalar", "scalar"
+            if queue is not None and len(queue) == queue.maxlen:
+                # Wait for the oldest queued instruction to be dispatched
+                qdisp, qidx = queue[0]
+                if qdisp > leave[0]:
+                    leave = (qdisp, ("queue_full", qidx, qdisp))
+            elif queue is None and last_dispatch["scalar"] > leave[0]:
+                # Scalar dispatch slot holds a single instruction
+                leave = (last_dispatch["scalar"], ("queue_full", idx - 1, last_dispatch["scalar"]))
+            if leave[1][0] != "frontend":
+                self.stalls[leave[1][0]] += leave[0] - (fetch + 1)
+            decode_leave = leave[0]
+
+            # Dispatch in order from the queue once the unit is free
+            disp = (decode_leave + 1, ("dispatch", idx, decode_leave))
+            if last_dispatch[qname] + 1 > disp[0]:
+                disp = (last_dispatch[qname] + 1, ("dispatch",) + last_dispatch[qname + "_src"])
+            if unit_free[unit][0] > disp[0]:
+                self.stalls["unit_busy"] += unit_free[unit][0] - disp[0]
+                disp = (unit_free[unit][0], ("unit_busy",) + unit_free[unit][1:])
+            # Only one instruction is dispatched per cycle
+            dcycle = disp[0]
+            while dcycle in dispatch_used:
+                dcycle += 1
+            if dcycle != disp[0]:
+                disp = (dcycle, ("dispatch", idx, decode_leave))
+            dispatch_used.add(dcycle)
+            dispatch = dcycle
+            last_dispatch[qname] = dispatch
+            last_dispatch[qname + "_src"] = (idx, dispatch)
+            if queue is not None:
+                queue.append((dispatch, idx))
+
+            # Execute
+            conflict = 0
+            if unit == "mem":
+                done, ideal = self.mem_cycles(ins, dispatch + 1)
+                conflict = done - ideal
+                category = "memory"
+            elif unit == "scalar":
+                done = dispatch + 1
+                category = "scalar"
+            else:
+                done = dispatch + compute_cycles(self.config, ins)
+                category = "compute"
+            unit_free[unit] = (done, idx, done)
+            for entry in mark_srf:
+                srf_ready[entry] = (done, idx, done)
+            for entry in mark_vrf:
+                vrf_ready[entry] = (done, idx, done)
+
+            timing.append((leave, disp, done, category, conflict))
+            if ins.opcode == "HALT":
+                break
+            idx += 1
+
+        self.critical_path(timing)
+        return self.cycles
+
+    def critical_path(self, timing):
+        # Walk back from the last completing instruction, charging every edge
+        # of the path to a category, until the start of the trace.
+        last = max(range(len(timing)), key=lambda i: timing[i][2])
+        self.cycles = timing[last][2] + 1
+        self.path["frontend"] += 1  # the final cycle counting out the pipeline
+        idx = last
+        node, t = "done", timing[last][2]
+        while True:
+            leave, disp, done, category, conflict = timing[idx]
+            if node == "done":
+                length = done - disp[0]
+                self.path["bank_conflict"] += conflict
+                self.path[category] += length - conflict
+                self.path_ins[idx] = self.path_ins.get(idx, 0) + length
+                node, t = "dispatch", disp[0]
+                continue
+            if node == "dispatch":
+                cause, pidx, pt = disp[1]
+                # Decode to dispatch, or a zero length edge to the unit or queue
+                self.path["dispatch"] += t - pt
+                self.path_ins[idx] = self.path_ins.get(idx, 0) + t - pt
+                if cause == "dispatch" and pidx == idx:
+                    node, t = "leave", leave[0]
+                elif cause == "dispatch":
+                    idx, node, t = pidx, "dispatch", pt
+                else:
+                    idx, node, t = pidx, "done", pt
+                continue
+            # node == "leave"
+            cause, pidx, pt = leave[1]
+            if cause == "frontend":
+                self.path["frontend"] += t - pt
+                if pidx < 0:
+                    break
+                idx, node, t = pidx, "leave", pt
+            else:
+                # RAW or queue full wait, the time is spent in the producer
+                self.path["frontend"] += t - pt
+                if cause == "raw":
+                    idx, node, t = pidx, "done", pt
+                else:
+                    idx, node, t = pidx, "dispatch", pt
+
+    def report(self):
+        lines = [f"Estimated cycles: {self.cycles}", "Critical path:"]
+        for cat in PATH_CATEGORIES:
+            share = 100.0 * self.path[cat] / self.cycles if self.cycles else 0.0
+            lines.append(f"  {cat:<14} {self.path[cat]:>10} ({share:5.1f}%)")
+        lines.append("Stall cycles:")
+        for cause in STALL_CAUSES:
+            lines.append(f"  {cause:<14} {self.stalls[cause]:>10}")
+        top = sorted(self.path_ins.items(), key=lambda kv: -kv[1])[:5]
+        lines.append("Top critical instructions:")
+        for idx, cycles in top:
+            lines.append(f"  {cycles:>10}  {self.ITrace.Read(idx)}")
+        return "\n".join(lines)
+
+
+def validate(testsdir):
+    # Compare the estimate against the exact timing Core on every test with a trace
+    print(f"{'test':<20} {'exact':>10} {'estimate':>10} {'error':>8}")
+    for name in sorted(os.listdir(testsdir)):
+        iodir = os.path.join(testsdir, name)
+        if not os.path.isfile(os.path.join(iodir, "trace.txt")):
+            continue
+        config = Config(iodir)
+        itrace = ITrace(iodir)
+        estimate = Estimator(itrace, config).run()
+        exact = Core(itrace, config, iodir).run()
+        error = 100.0 * (estimate - exact) / exact
+        print(f"{name:<20} {exact:>10} {estimate:>10} {error:>7.1f}%")
+
+
+if __name__ == "__main__":
+    validate(sys.argv[1] if len(sys.argv) > 1 else os.path.join("..", "tests"))
@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+import memfootprint
+
+from itrace import ITrace
+from tracefile import IndexedTrace
+from core import Core
+from jitcore import JitCore
+from timeline import Timeline
+from cpistack import CPIStack
+from observer import CyclewiseLog
+from incremental import Snapshots
+
+# Subsystem of the memory allocated by a module or a function, functions take
+# precedence over the module they are in. Allocations of other modules are
+# charged to the nearest caller listed here.
+RULES = [
+    (ITrace, "ITrace"),
+    (IndexedTrace, "ITrace"),
+    (Core, "timing state"),
+    (JitCore, "timing state"),
+    (Timeline, "timeline"),
+    (CPIStack, "timeline"),
+    (CyclewiseLog, "cyclewise"),
+    (Snapshots, "snapshots"),
+]
+
+
+class Footprint(memfootprint.Footprint):
+    # Footprint of the subsystems of this simulator, see common/memfootprint.py
+    def __init__(self, rules=RULES):
+        super().__init__(rules)
@@ -0,0 +1,62 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from core import Core, ARCH_PARAMS
+from incremental import core_state
+from search import WORKER, init_worker
+
+
+def capture(core):
+    # Pipeline state of a core at the end of a cycle, as bytes
+    return pickle.dumps(core_state(core), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def simulate(state, params):
+    # Continue a captured state on the trace of a search.init_worker process,
+    # with the base config overridden by params
+    config = WORKER["config"]
+    vcore = Core(WORKER["itrace"], config, "")
+    vcore.__dict__.update(pickle.loads(state))
+    vcore.reconfigure(config.override(params))
+    vcore.run()
+    return vcore.counters()
+
+
+class Fork(object):
+    # What-if analysis of config changes from a cycle on. The trace runs with
+    # the base config up to cycle `at`, once, and the captured state is then
+    # continued with every variant on a process pool, so a shared prefix such
+    # as an initialization loop is not simulated again for every variant.
+    # The parameters which size architectural state can not change, see
+    # Core.reconfigure for how the others take effect.
+    def __init__(self, itrace, config, at):
+        self.ITrace = itrace
+        self.config = config
+        self.at = at
+        self.state = None
+        # Cycle and fetched instructions of the captured state
+        self.cycle = 0
+        self.count = 0
+
+    def prefix(self):
+        vcore = Core(self.ITrace, self.config, "")
+        while not vcore.done() and vcore.cycle < self.at:
+            vcore.step()
+        self.cycle = vcore.cycle
+        self.count = vcore.count
+        self.state = capture(vcore)
+
+    def run(self, points, iodir, jobs=1, binary=False, indexed=False):
+        for point in points:
+            # Invalid variants fail here, not in a worker
+            for key in ARCH_PARAMS:
+                if key in point and int(point[key]) != getattr(self.config, key):
+                    raise Exception(f"Fork - ERROR: {key} is architectural, it can not change after the fork")
+        if self.state is None:
+            self.prefix()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(iodir, binary, indexed)) as pool:
+            futures = [pool.submit(simulate, self.state, point) for point in points]
+            return [future.result() for future in futures]
+
+    def report(self):
+        return f"Fork - Prefix simulated once up to cycle {self.cycle}, {self.count} instructions fetched"
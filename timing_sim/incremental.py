@@ -0,0 +1,105 @@
+import os
+import json
+import pickle
+import hashlib
+
+from core import Core, SIM_VERSION
+from observer import Observer
+
+# Folder of the snapshots inside the test folder
+SNAPSHOT_DIR = ".incremental"
+
+
+def core_state(core, skip=()):
+    # Pipeline state of a timing Core, the attributes in Core.STATE but those
+    # in skip, restored by core.__dict__.update()
+    return {key: getattr(core, key) for key in Core.STATE if key not in skip}
+
+
+def prefix_digests(tracepath, counts):
+    # Hash of the first `count` lines of the trace, for each of the sorted
+    # counts. Stops at the end of the file.
+    digests = {}
+    counts = sorted(counts)
+    if not counts:
+        return digests
+    h = hashlib.sha256()
+    k = 0
+    with open(tracepath, "rb") as tf:
+        for lines, line in enumerate(tf, 1):
+            h.update(line)
+            if lines == counts[k]:
+                digests[lines] = h.hexdigest()
+                k += 1
+                if k == len(counts):
+                    break
+    return digests
+
+
+class Snapshots(Observer):
+    # Snapshots of the timing Core, taken every `interval` fetched instructions,
+    # kept in <iodir>/.incremental/timing. The pipeline state when `count`
+    # instructions are fetched depends only on those instructions and the
+    # config, so a later run resumes from the last snapshot whose trace prefix
+    # hash matches the new trace and whose config is the same.
+    def __init__(self, iodir, config, interval=20000):
+        self.iodir = iodir
+        self.dirpath = os.path.join(iodir, SNAPSHOT_DIR, "timing")
+        self.interval = interval
+        self.next_count = interval
+        self.setup = {"version": SIM_VERSION, "parameters": config.parameters}
+        # Snapshots valid for this run, as {"count", "file"}
+        self.taken = []
+        self.meta = None
+        metapath = os.path.join(self.dirpath, "meta.json")
+        if os.path.isfile(metapath):
+            with open(metapath, "r") as mf:
+                self.meta = json.load(mf)
+
+    def resume(self, core):
+        meta = self.meta
+        if meta is None or meta["setup"] != self.setup:
+            print("Incremental - No previous run with this config, running from cycle 0")
+            return
+        tracepath = os.path.join(self.iodir, "trace.txt")
+        digests = prefix_digests(tracepath, [snap["count"] for snap in meta["snapshots"]])
+        valid = []
+        for snap in meta["snapshots"]:
+            if digests.get(snap["count"]) != snap["digest"]:
+                break
+            valid.append(snap)
+        if not valid:
+            print("Incremental - No snapshot before the first changed instruction, running from cycle 0")
+            return
+        snap = valid[-1]
+        with open(os.path.join(self.dirpath, snap["file"]), "rb") as sf:
+            core.__dict__.update(pickle.load(sf))
+        self.taken = [{"count": s["count"], "file": s["file"]} for s in valid]
+        self.next_count = snap["count"] + self.interval
+        print(f"Incremental - Resumed from snapshot at instruction {snap['count']}, cycle {core.cycle}")
+
+    def tick(self, core):
+        if core.count >= self.next_count:
+            self.take(core)
+
+    def take(self, core):
+        state = core_state(core)
+        os.makedirs(self.dirpath, exist_ok=True)
+        filename = f"snapshot_{core.count}.pkl"
+        with open(os.path.join(self.dirpath, filename), "wb") as sf:
+            pickle.dump(state, sf, protocol=pickle.HIGHEST_PROTOCOL)
+        self.taken.append({"count": core.count, "file": filename})
+        self.next_count = core.count + self.interval
+
+    def save(self):
+        tracepath = os.path.join(self.iodir, "trace.txt")
+        digests = prefix_digests(tracepath, [snap["count"] for snap in self.taken])
+        snapshots = [dict(snap, digest=digests.get(snap["count"])) for snap in self.taken]
+        os.makedirs(self.dirpath, exist_ok=True)
+        with open(os.path.join(self.dirpath, "meta.json"), "w") as mf:
+            json.dump({"setup": self.setup, "snapshots": snapshots}, mf)
+        # Remove the snapshots of the previous run taken after the resume point
+        keep = {snap["file"] for snap in self.taken}
+        for filename in os.listdir(self.dirpath):
+            if filename.endswith(".pkl") and filename not in keep:
+                os.remove(os.path.join(self.dirpath, filename))
@@ -1,19 +1,34 @@
 import os
+import re
+import sys
+import json
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+# Register operand, e.g. SR1 or VR7
+REG_RE = re.compile(r"(SR|VR)(\d+)$")
+# Trace line: optional static PC, opcode, operands and optional runtime value in parentheses
+TRACE_RE = re.compile(r"(?:(\d+): )?(\S+)((?: [^ ]*?)*?)(?: \(([^)]*)\))?$")
 
 class Reg(object):
     """
     Defines name of architectural registers.
-    Scalar: SR0 - SR7
-    Vector: VR0 - VR7
+    Scalar: SR0 - SR<numScalarRegs-1>
+    Vector: VR0 - VR<numVectorRegs-1>
+    Register indices are checked by the functional simulator against its
+    config, the timing busyboards are sized from the timing Config.
     """
 
     SCALAR = "SR"
     VECTOR = "VR"
 
+    # Interned registers, every register is created only once
+    INTERNED = {}
+
     def __init__(self, ty=SCALAR, idx=1):
         if ty not in {Reg.SCALAR, Reg.VECTOR}:
             raise Exception(f"Invalid type: {ty}")
-        if idx < 0 or idx > 7:
+        if idx < 0:
             raise Exception(f"Invalid index: {idx}")
         self.ty = ty
         self.idx = idx
@@ -24,39 +39,92 @@ class Reg(object):
     def __eq__(self, other):
         return self.ty == other.ty and self.idx == other.idx
 
+    @staticmethod
+    def get(ty, idx):
+        key = (ty, idx)
+        if key not in Reg.INTERNED:
+            Reg.INTERNED[key] = Reg(ty, idx)
+        return Reg.INTERNED[key]
+
     @staticmethod
     def parse(s):
         # Parse string and determine register type and index
-        try:
-            return Reg(s[:2], int(s[2:]))
-        except Exception as e:
-            # print(s, e)
+        m = REG_RE.match(s)
+        if m is None:
             return None
+        return Reg.get(m.group(1), int(m.group(2)))
+
+class StaticInstruction(object):
+    # Opcode and operands of an instruction, shared by all dynamic
+    # instances of the same static instruction in the trace
+    __slots__ = ("pc", "opcode", "ops", "text", "busy")
+
+    def __init__(self, pc, opcode, ops, text):
+        # Index in Code.asm, None for traces without PC
+        self.pc = pc
+        self.opcode = opcode
+        self.ops = ops
+        # Text of PC, opcode and operands as in the trace
+        self.text = text
+        # Busyboard entries, decoded once by the timing core
+        self.busy = None
+
+    @staticmethod
+    def key(pctext, opcode, opstext):
+        # Text of PC, opcode and operands, identifies the static instruction
+        return opcode + opstext if pctext is None else f"{pctext}: {opcode}{opstext}"
+
+    @staticmethod
+    def parse(pctext, opcode, opstext):
+        ops = [Instruction.parse_operand(s) for s in opstext[1:].split(" ")] if opstext else []
+        pc = None if pctext is None else int(pctext)
+        return StaticInstruction(pc, opcode, ops, StaticInstruction.key(pctext, opcode, opstext))
 
 class Instruction(object):
     # Helper class to hold instructions and
     # provide access to operands and immediate value
+    __slots__ = ("static", "pc", "opcode", "ops", "value", "idx")
+
     def __init__(self, line, idx=-1):
         if len(line) == 0:
             raise Exception("Empty instruction line")
 
-        splits = line.split(" ")
-        self.opcode = splits[0]
-        self.value = Instruction.parse_value(splits[-1])
-        if self.value is not None:
-            self.ops = [Instruction.parse_operand(s) for s in splits[1:-1]]
-        else:
-            self.ops = [Instruction.parse_operand(s) for s in splits[1:]]
+        m = TRACE_RE.match(line)
+        self.static = StaticInstruction.parse(m.group(1), m.group(2), m.group(3))
+        self.pc = self.static.pc
+        self.opcode = self.static.opcode
+        self.ops = self.static.ops
+        self.value = Instruction.parse_value(m.group(4))
         self.idx = idx
 
+    @property
+    def busy(self):
+        return self.static.busy
+
+    @busy.setter
+    def busy(self, busy):
+        self.static.busy = busy
+
+    @staticmethod
+    def view(static, value, idx):
+        # Dynamic instruction sharing the static part, without parsing
+        ins = Instruction.__new__(Instruction)
+        ins.static = static
+        ins.pc = static.pc
+        ins.opcode = static.opcode
+        ins.ops = static.ops
+        ins.value = value
+        ins.idx = idx
+        return ins
+
     @staticmethod
     def parse_value(valuestr):
-        if valuestr.startswith('(') and valuestr.endswith(')'):
-            value = [int(v) for v in valuestr[1:-1].split(',')]
-            if len(value) == 1:
-                value = value[0]
-            return value
-        return None
+        if valuestr is None:
+            return None
+        value = list(map(int, valuestr.split(',')))
+        if len(value) == 1:
+            value = value[0]
+        return value
 
     @staticmethod
     def parse_operand(opstr):
@@ -64,7 +132,7 @@ class Instruction(object):
         if not sr:
             try:
                 return int(opstr)
-            except:
+            except ValueError:
                 return sr
         else:
             return sr
@@ -83,26 +151,170 @@ class Instruction(object):
             return f"{self.opcode}:{self.ops}"
 
 
+def parse_chunk(filepath, start, end):
+    # Parse the lines in byte range [start, end) of a trace file.
+    # Runs in a worker process, so the result is kept compact for pickling:
+    # the distinct static parts, the static id of every record, and all values
+    # flattened in one array with the [start, end) of each record, start is -1
+    # if it has no value.
+    statics = []
+    static_ids = {}
+    ids = array("i")
+    bounds = array("q")
+    values = array("i")
+    with open(filepath, "rb") as insf:
+        insf.seek(start)
+        data = insf.read(end - start).decode()
+    for line in data.splitlines():
+        if "#" in line:
+            line = line[: line.index("#")]
+        line = line.strip()
+        if not line:
+            continue
+        m = TRACE_RE.match(line)
+        key = m.group(1, 2, 3)
+        if key not in static_ids:
+            static_ids[key] = len(statics)
+            statics.append(key)
+        ids.append(static_ids[key])
+        if m.group(4) is None:
+            bounds.extend((-1, -1))
+        else:
+            start = len(values)
+            values.extend(map(int, m.group(4).split(",")))
+            bounds.extend((start, len(values)))
+    return statics, ids, bounds, values
+
+
+def chunk_ranges(filepath, chunks):
+    # Split a file into byte ranges at line boundaries
+    size = os.path.getsize(filepath)
+    bounds = [0]
+    with open(filepath, "rb") as insf:
+        for i in range(1, chunks):
+            insf.seek(max(size * i // chunks, bounds[-1]))
+            insf.readline()
+            bounds.append(min(insf.tell(), size))
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(chunks) if bounds[i + 1] > bounds[i]]
+
+
 class ITrace(object):
-    def __init__(self, iodir):
-        self.filepath = os.path.abspath(os.path.join(iodir, "trace.txt"))
-        self.instructions = []
-
-        with open(self.filepath, "r") as insf:
-            idx = 0
-            for line in insf:
-                # Ignore comments
-                if "#" in line:
-                    line = line[: line.index("#")]
-                line = line.strip()
-                if line:
-                    self.instructions.append(Instruction(line, idx))
-                    idx += 1
+    # Instruction trace stored as struct of arrays:
+    # - statics: table of the static instructions (PC, opcode and operands),
+    #   interned per trace and dropped with it
+    # - static_ids: index into statics of every dynamic instruction
+    # - values: all runtime values flattened into one int32 pool, the value of
+    #   instruction idx is values[offsets[idx]:offsets[idx + 1]], None if empty
+    # Read() returns a lightweight Instruction view of one record.
+    BIN_MAGIC = b"VMIPSTRC"
+    BIN_VERSION = 1
+
+    def __init__(self, iodir, jobs=1, binary=False, name="trace"):
+        # name is trace_<i> for core i of a multi-core run
+        self.filepath = os.path.abspath(os.path.join(iodir, name + ".txt"))
+        self.binpath = os.path.abspath(os.path.join(iodir, name + ".bin"))
+        self.statics = []
+        self.static_index = {}  # StaticInstruction.key: index in statics
+        self.static_ids = array("i")
+        self.offsets = array("q", [0])
+        self.values = array("i")
+
+        if binary and os.path.isfile(self.binpath) and (
+            not os.path.isfile(self.filepath)
+            or os.path.getmtime(self.binpath) >= os.path.getmtime(self.filepath)
+        ):
+            self.load_binary(self.binpath)
+            print("ITrace - Instruction trace loaded from binary file:", self.binpath)
+            return
+
+        if jobs > 1:
+            self.load_parallel(jobs)
+        else:
+            self.append_chunk(*parse_chunk(self.filepath, 0, os.path.getsize(self.filepath)))
         print("ITrace - Instruction trace loaded from file:", self.filepath)
+        if binary:
+            self.save_binary(self.binpath)
+
+    def __len__(self):
+        return len(self.static_ids)
+
+    def append_chunk(self, statics, ids, bounds, values):
+        # Append records parsed by parse_chunk, interning the static
+        # instructions so they are shared across chunks
+        table = [self.add_static(pctext, opcode, opstext) for pctext, opcode, opstext in statics]
+        self.static_ids.extend(table[sid] for sid in ids)
+        base = len(self.values)
+        self.values.extend(values)
+        offsets = self.offsets
+        for k in range(len(ids)):
+            start, end = bounds[2 * k], bounds[2 * k + 1]
+            offsets.append(offsets[-1] if start < 0 else base + end)
+
+    def add_static(self, pctext, opcode, opstext):
+        key = StaticInstruction.key(pctext, opcode, opstext)
+        idx = self.static_index.get(key)
+        if idx is None:
+            idx = self.static_index[key] = len(self.statics)
+            self.statics.append(StaticInstruction.parse(pctext, opcode, opstext))
+        return idx
+
+    def load_parallel(self, jobs):
+        # Parse chunks of the file on a process pool
+        ranges = chunk_ranges(self.filepath, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(parse_chunk, self.filepath, start, end) for start, end in ranges]
+            for future in futures:
+                self.append_chunk(*future.result())
+
+    def save_binary(self, binpath):
+        # Binary trace: magic, header length, JSON header with the static
+        # instruction table, then the raw arrays
+        header = json.dumps({
+            "version": ITrace.BIN_VERSION,
+            "byteorder": sys.byteorder,
+            "count": len(self.static_ids),
+            "values": len(self.values),
+            "statics": [static.text for static in self.statics],
+        }).encode()
+        with open(binpath, "wb") as binf:
+            binf.write(ITrace.BIN_MAGIC)
+            binf.write(len(header).to_bytes(8, "little"))
+            binf.write(header)
+            self.static_ids.tofile(binf)
+            self.offsets.tofile(binf)
+            self.values.tofile(binf)
+        print("ITrace - Binary trace written to file:", binpath)
+
+    def load_binary(self, binpath):
+        with open(binpath, "rb") as binf:
+            if binf.read(len(ITrace.BIN_MAGIC)) != ITrace.BIN_MAGIC:
+                raise Exception(f"ITrace - ERROR: Not a binary trace file: {binpath}")
+            header = json.loads(binf.read(int.from_bytes(binf.read(8), "little")))
+            if header["version"] != ITrace.BIN_VERSION:
+                raise Exception(f"ITrace - ERROR: Unsupported binary trace version: {header['version']}")
+            for text in header["statics"]:
+                m = TRACE_RE.match(text)
+                self.add_static(*m.group(1, 2, 3))
+            self.static_ids.fromfile(binf, header["count"])
+            self.offsets = array("q")
+            self.offsets.fromfile(binf, header["count"] + 1)
+            self.values.fromfile(binf, header["values"])
+        if header["byteorder"] != sys.byteorder:
+            for arr in (self.static_ids, self.offsets, self.values):
+                arr.byteswap()
 
     def Read(self, idx):
-        if idx < len(self.instructions):
-            return self.instructions[idx]
+        if idx < len(self.static_ids):
+            start = self.offsets[idx]
+            end = self.offsets[idx + 1]
+            if start == end:
+                value = None
+            elif end - start == 1:
+                value = self.values[start]
+            else:
+                value = self.values[start:end].tolist()
+            return Instruction.view(self.statics[self.static_ids[idx]], value, idx)
         else:
             return HALT  # If accessing undefined instructions, return HALT
 
@@ -0,0 +1,311 @@
+from array import array
+
+from itrace import Instruction, HALT
+from core import Core, VEC_DATA_OPS, VEC_COMPUTE_OPS, BRANCH_OPS
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Kind of a static instruction, selects its decode path
+KIND_SCALAR = 0
+KIND_DATA = 1
+KIND_COMPUTE = 2
+KIND_BRANCH = 3
+KIND_HALT = 4
+# Backend unit of a vector compute instruction
+UNIT_MUL = 0
+UNIT_DIV = 1
+UNIT_ADD = 2
+# Empty lane stage or lane head, no address is that negative
+NO_ADDR = -(1 << 62)
+# Layout of the params array
+(P_LANES, P_BANKS, P_BANKWAIT, P_RING, P_DATA_DEPTH, P_COMPUTE_DEPTH,
+ P_DEPTH_MUL, P_DEPTH_DIV, P_DEPTH_ADD, P_MVL, P_HALT_SID, NUM_PARAMS) = range(12)
+
+
+def simulate(static_ids, offsets, values, kind, unit, check_off, check, mark_off, mark, params,
+             busy, data_q, compute_q, addr_next, lane_heads, lane_pipes, bank_busy):
+    # The cycle loop of Core.run over array encoded state, compiled by Numba.
+    # Instructions are their index in the trace, -1 is an empty stage, and
+    # indices past the end of the trace are HALT like ITrace.Read.
+    # Every stage follows the Core method of the same name, see core.py.
+    # Returns cycles, fetched instructions, and the index of a memory
+    # instruction without addresses or -1.
+    lanes = params[P_LANES]
+    banks = params[P_BANKS]
+    bankwait = params[P_BANKWAIT]
+    ring = params[P_RING]
+    data_depth = params[P_DATA_DEPTH]
+    compute_depth = params[P_COMPUTE_DEPTH]
+    halt_sid = params[P_HALT_SID]
+    num_ins = len(static_ids)
+    data_size = len(data_q)
+    compute_size = len(compute_q)
+
+    cycle = 0
+    count = 0
+    halted = False
+    decode_ins = -1
+    data_head = 0
+    data_len = 0
+    compute_head = 0
+    compute_len = 0
+    dispatch_scalar_ins = -1
+    mem_ins = -1
+    mem_start = 0
+    num_addrs = 0
+    addrs_remaining = 0
+    pipe_head = 0
+    mul_ins = -1
+    mul_cycles_left = 0
+    div_ins = -1
+    div_cycles_left = 0
+    add_ins = -1
+    add_cycles_left = 0
+    scalar_ins = -1
+
+    while not (halted and mul_ins < 0 and div_ins < 0 and add_ins < 0 and scalar_ins < 0 and mem_ins < 0
+               and dispatch_scalar_ins < 0 and data_len == 0 and compute_len == 0 and decode_ins < 0):
+        # backend_stage
+        if mem_ins >= 0:
+            if addrs_remaining != 0:
+                # backend_mem
+                wait_slot = (pipe_head + bankwait - 1) % ring
+                last_slot = (pipe_head + ring - 1) % ring
+                for i in range(lanes):
+                    base = i * ring
+                    waddr = lane_heads[i] if bankwait == 0 else lane_pipes[base + wait_slot]
+                    if waddr != NO_ADDR:
+                        bank_busy[waddr % banks] = 1
+                    if lane_pipes[base + last_slot] != NO_ADDR:
+                        addrs_remaining -= 1
+                    addr = lane_heads[i]
+                    if addr != NO_ADDR and bank_busy[addr % banks] != 0:
+                        lane_pipes[base + last_slot] = addr
+                        lane_heads[i] = NO_ADDR
+                        bank_busy[addr % banks] = 0
+                    else:
+                        lane_pipes[base + last_slot] = NO_ADDR
+                    if lane_heads[i] == NO_ADDR and addr_next[i] < num_addrs:
+                        lane_heads[i] = values[mem_start + addr_next[i]]
+                        addr_next[i] += lanes
+                pipe_head = last_slot
+            if addrs_remaining == 0:
+                sid = static_ids[mem_ins]
+                for j in range(mark_off[sid], mark_off[sid + 1]):
+                    busy[mark[j]] = 1
+                mem_ins = -1
+
+        if mul_ins >= 0:
+            if mul_cycles_left == 1:
+                sid = static_ids[mul_ins]
+                for j in range(mark_off[sid], mark_off[sid + 1]):
+                    busy[mark[j]] = 1
+                mul_ins = -1
+            else:
+                mul_cycles_left -= 1
+
+        if div_ins >= 0:
+            if div_cycles_left == 1:
+                sid = static_ids[div_ins]
+                for j in range(mark_off[sid], mark_off[sid + 1]):
+                    busy[mark[j]] = 1
+                div_ins = -1
+            else:
+                div_cycles_left -= 1
+
+        if add_ins >= 0:
+            if add_cycles_left == 1:
+                sid = static_ids[add_ins]
+                for j in range(mark_off[sid], mark_off[sid + 1]):
+                    busy[mark[j]] = 1
+                add_ins = -1
+            else:
+                add_cycles_left -= 1
+
+        if scalar_ins >= 0:
+            sid = static_ids[scalar_ins] if scalar_ins < num_ins else halt_sid
+            for j in range(mark_off[sid], mark_off[sid + 1]):
+                busy[mark[j]] = 1
+            scalar_ins = -1
+
+        # dispatch_vec_data, then dispatch_vec_compute, then dispatch_scalar
+        dispatched = False
+        if data_len > 0 and mem_ins < 0:
+            ins = data_q[data_head]
+            data_head = (data_head + 1) % data_size
+            data_len -= 1
+            mem_start = offsets[ins]
+            num_addrs = offsets[ins + 1] - mem_start
+            if num_addrs == 0:
+                return cycle, count, ins
+            addrs_remaining = num_addrs
+            for i in range(lanes):
+                if i < num_addrs:
+                    lane_heads[i] = values[mem_start + i]
+                    addr_next[i] = i + lanes
+                else:
+                    addr_next[i] = i
+            mem_ins = ins
+            dispatched = True
+        if not dispatched and compute_len > 0:
+            ins = compute_q[compute_head]
+            u = unit[static_ids[ins]]
+            if (u == UNIT_MUL and mul_ins < 0) or (u == UNIT_DIV and div_ins < 0) or (u == UNIT_ADD and add_ins < 0):
+                veclen = values[offsets[ins]] if offsets[ins + 1] > offsets[ins] else params[P_MVL]
+                if u == UNIT_MUL:
+                    mul_ins = ins
+                    mul_cycles_left = params[P_DEPTH_MUL] - 1 - (-veclen // lanes)
+                elif u == UNIT_DIV:
+                    div_ins = ins
+                    div_cycles_left = params[P_DEPTH_DIV] - 1 - (-veclen // lanes)
+                else:
+                    add_ins = ins
+                    add_cycles_left = params[P_DEPTH_ADD] - 1 - (-veclen // lanes)
+                compute_head = (compute_head + 1) % compute_size
+                compute_len -= 1
+                dispatched = True
+        if not dispatched and dispatch_scalar_ins >= 0 and scalar_ins < 0:
+            scalar_ins = dispatch_scalar_ins
+            dispatch_scalar_ins = -1
+
+        # decode_stage
+        if decode_ins >= 0:
+            sid = static_ids[decode_ins] if decode_ins < num_ins else halt_sid
+            k = kind[sid]
+            ready = True
+            if k != KIND_BRANCH:
+                for j in range(check_off[sid], check_off[sid + 1]):
+                    if busy[check[j]] == 0:
+                        ready = False
+                        break
+            if ready:
+                accepted = False
+                if k == KIND_DATA:
+                    if data_len < data_depth:
+                        data_q[(data_head + data_len) % data_size] = decode_ins
+                        data_len += 1
+                        accepted = True
+                elif k == KIND_COMPUTE:
+                    if compute_len < compute_depth:
+                        compute_q[(compute_head + compute_len) % compute_size] = decode_ins
+                        compute_len += 1
+                        accepted = True
+                elif dispatch_scalar_ins < 0:
+                    dispatch_scalar_ins = decode_ins
+                    accepted = True
+                if accepted:
+                    decode_ins = -1
+                    for j in range(mark_off[sid], mark_off[sid + 1]):
+                        busy[mark[j]] = 0
+
+        # fetch_stage
+        if decode_ins < 0 and not halted:
+            decode_ins = count
+            count += 1
+            sid = static_ids[decode_ins] if decode_ins < num_ins else halt_sid
+            if kind[sid] == KIND_HALT:
+                halted = True
+
+        cycle += 1
+
+    return cycle, count, -1
+
+
+# Compiled once and cached next to this file across runs. Without Numba the
+# same loop runs interpreted, still faster than Core as it has no objects.
+COMPILED = njit is not None
+simulate_jit = njit(cache=True)(simulate) if COMPILED else simulate
+
+
+class JitCore(object):
+    # Timing Core running the cycle loop as compiled code, see simulate.
+    # The static instructions of the trace are encoded once into arrays,
+    # with their busyboard entries decoded by Core.decode_busyboard so both
+    # engines agree on dependencies. Results are the same as Core, cycle for
+    # cycle, without the cyclewise log, timeline and progress reporting.
+    def __init__(self, itrace, config):
+        self.ITrace = itrace
+        self.config = config
+        self.cycle = 0
+        self.count = 0
+
+    def encode(self):
+        config = self.config
+        num_srf = config.numScalarRegs + 2
+        num_vrf = config.numVectorRegs
+        kind = array("q")
+        unit = array("q")
+        check_off = array("q", [0])
+        check = array("q")
+        mark_off = array("q", [0])
+        mark = array("q")
+        # One busyboard, the SRF entries then the VRF entries, indexed
+        # the same way as the Core lists including negative indices
+        def entry(idx, size, base):
+            if not -size <= idx < size:
+                raise Exception(f"JitCore - ERROR: Busyboard entry {idx} out of range {size}")
+            return base + idx % size
+
+        for static in self.ITrace.statics + [HALT.static]:
+            opcode = static.opcode
+            if opcode == "HALT":
+                kind.append(KIND_HALT)
+            elif opcode in BRANCH_OPS:
+                kind.append(KIND_BRANCH)
+            elif opcode in VEC_DATA_OPS:
+                kind.append(KIND_DATA)
+            elif opcode in VEC_COMPUTE_OPS:
+                kind.append(KIND_COMPUTE)
+            else:
+                kind.append(KIND_SCALAR)
+            if opcode.startswith("MUL"):
+                unit.append(UNIT_MUL)
+            elif opcode.startswith("DIV"):
+                unit.append(UNIT_DIV)
+            else:
+                unit.append(UNIT_ADD)
+            check_srf, check_vrf, mark_srf, mark_vrf = Core.decode_busyboard(Instruction.view(static, None, -1))
+            check.extend(entry(idx, num_srf, 0) for idx in check_srf)
+            check.extend(entry(idx, num_vrf, num_srf) for idx in check_vrf)
+            check_off.append(len(check))
+            mark.extend(entry(idx, num_srf, 0) for idx in mark_srf)
+            mark.extend(entry(idx, num_vrf, num_srf) for idx in mark_vrf)
+            mark_off.append(len(mark))
+
+        params = array("q", [0] * NUM_PARAMS)
+        params[P_LANES] = config.numLanes
+        params[P_BANKS] = config.vdmNumBanks
+        params[P_BANKWAIT] = config.vdmBankWait
+        params[P_RING] = config.vlsPipelineDepth - 1
+        params[P_DATA_DEPTH] = config.dataQueueDepth
+        params[P_COMPUTE_DEPTH] = config.computeQueueDepth
+        params[P_DEPTH_MUL] = config.pipelineDepthMul
+        params[P_DEPTH_DIV] = config.pipelineDepthDiv
+        params[P_DEPTH_ADD] = config.pipelineDepthAdd
+        params[P_MVL] = config.maxVectorLength
+        params[P_HALT_SID] = len(self.ITrace.statics)
+        return kind, unit, check_off, check, mark_off, mark, params
+
+    def run(self):
+        config = self.config
+        lanes = config.numLanes
+        itrace = self.ITrace
+        state = (
+            array("q", [1] * (config.numScalarRegs + 2 + config.numVectorRegs)),
+            array("q", [0] * max(config.dataQueueDepth, 1)),
+            array("q", [0] * max(config.computeQueueDepth, 1)),
+            array("q", [0] * lanes),
+            array("q", [NO_ADDR] * lanes),
+            array("q", [NO_ADDR] * (lanes * (config.vlsPipelineDepth - 1))),
+            array("q", [1] * config.vdmNumBanks),
+        )
+        self.cycle, self.count, error = simulate_jit(itrace.static_ids, itrace.offsets, itrace.values, *self.encode(), *state)
+        if error >= 0:
+            raise Exception(f"Memory instruction {itrace.Read(error)} does not have addresses")
+        return self.cycle
+
+    def counters(self):
+        return {"cycles": self.cycle, "instructions": self.count}
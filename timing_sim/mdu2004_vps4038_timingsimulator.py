@@ -1,12 +1,273 @@
 import os
+import sys
 import argparse
 
-from itrace import ITrace
+from tracefile import open_trace, parse_slice
 from core import Core, Config
+from cache import ResultCache, DEFAULT_CACHE_DIR
+from sweep import parse_sweep
+from estimate import Estimator
+from cpistack import CPIStack
+from search import Search
+from progress import Progress, Runaway
+from incremental import Snapshots
+from jitcore import JitCore, COMPILED
+from multicore import scaling, report
+from remap import run_remaps, report as remap_report
+from footprint import Footprint
+from fork import Fork
+
+# What the simulator does is picked up front with --mode, every mode accepts
+# the common options and its own, by argparse dest
+COMMON_OPTIONS = {"mode", "iodir", "binary_trace"}
+CACHE_OPTIONS = {"no_cache", "cache_dir", "cache_size"}
+MODE_OPTIONS = {
+    # One config, with the optional outputs of a single simulation
+    "run": {
+        "jobs", "indexed", "slice", "engine", "cyclewise", "timeline", "cpistack", "progress", "metrics_file",
+        "incremental", "snapshot_interval", "mem_footprint",
+    } | CACHE_OPTIONS,
+    # Every point of the --sweep grid
+    "sweep": {"jobs", "indexed", "slice", "engine", "sweep", "mem_footprint"} | CACHE_OPTIONS,
+    # Analytic estimate of one config, or of every --sweep point
+    "estimate": {"jobs", "indexed", "slice", "sweep"},
+    # Successive halving over the --sweep grid
+    "search": {"jobs", "indexed", "sweep", "eta", "area"} | CACHE_OPTIONS,
+    # The --sweep points as what-if variants from cycle --fork-at on
+    "fork": {"jobs", "indexed", "sweep", "fork_at"},
+    # The --remap address layouts
+    "remap": {"jobs", "indexed", "remap"} | CACHE_OPTIONS,
+    # Cycle scaling of 1 to --cores cores sharing the VDMEM banks
+    "cores": {"cores", "quantum"},
+}
+# Options a mode can not do without
+REQUIRED_OPTIONS = {
+    "sweep": ("sweep",),
+    "search": ("sweep",),
+    "fork": ("sweep", "fork_at"),
+    "remap": ("remap",),
+    "cores": ("cores",),
+}
+# Options of the same mode which can not be combined
+CONFLICTS = [
+    ("engine", "cyclewise"),
+    ("engine", "timeline"),
+    ("engine", "cpistack"),
+    ("engine", "progress"),
+    ("engine", "incremental"),
+    ("engine", "indexed"),
+    ("engine", "slice"),
+    ("incremental", "cyclewise"),
+    ("incremental", "timeline"),
+    ("incremental", "cpistack"),
+    ("incremental", "slice"),
+    ("cpistack", "indexed"),
+    ("cpistack", "slice"),
+]
+
+
+def option(dest, args=None):
+    # Command line option of an argparse dest, with its value for --engine
+    name = "--" + dest.replace("_", "-")
+    return f"{name} {args.engine}" if dest == "engine" and args is not None else name
+
+
+def check_options(parser, args):
+    # Options given on the command line, those which differ from their default
+    given = {dest for dest, val in vars(args).items() if val != parser.get_default(dest)}
+    for dest in sorted(given - COMMON_OPTIONS - MODE_OPTIONS[args.mode]):
+        parser.error(f"{option(dest)} can not be used with --mode {args.mode}")
+    for dest in REQUIRED_OPTIONS.get(args.mode, ()):
+        if dest not in given:
+            parser.error(f"--mode {args.mode} needs {option(dest)}")
+    for first, second in CONFLICTS:
+        if first in given and second in given:
+            parser.error(f"{option(first, args)} can not be combined with {option(second, args)}")
+
+
+def trace_hash(iodir, binary):
+    # Content hash of the trace, of trace.bin if there is only the binary trace
+    tracepath = os.path.join(iodir, "trace.txt")
+    if binary and not os.path.isfile(tracepath):
+        tracepath = os.path.join(iodir, "trace.bin")
+    return ResultCache.hash_trace(tracepath)
+
+
+def print_sweep(points, results, label="Cycles", field="cycles"):
+    for point, result in zip(points, results):
+        params = " ".join(f"{key}={val}" for key, val in point.items())
+        print(f"Sweep: {params} {label}: {result[field]}")
+
+
+def run_cores(args, iodir, config):
+    alone, rows = scaling(iodir, args.cores, config, args.quantum, binary=args.binary_trace)
+    print(report(alone, rows))
+
+
+def run_estimate(args, iodir, config):
+    bounds = parse_slice(args.slice) if args.slice else None
+    itrace = open_trace(iodir, jobs=args.jobs, binary=args.binary_trace, indexed=args.indexed, bounds=bounds)
+    if args.sweep:
+        points = parse_sweep(args.sweep)
+        results = [{"cycles": Estimator(itrace, config.override(point)).run()} for point in points]
+        print_sweep(points, results, label="Estimated cycles")
+    else:
+        estimator = Estimator(itrace, config)
+        estimator.run()
+        print(estimator.report())
+
+
+def run_search(args, iodir, config):
+    itrace = open_trace(iodir, jobs=args.jobs, binary=args.binary_trace, indexed=args.indexed)
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_size)
+    search = Search(
+        itrace, config, parse_sweep(args.sweep), iodir,
+        eta=args.eta, area=args.area.split(","), jobs=args.jobs, binary=args.binary_trace,
+        indexed=args.indexed,
+    )
+    search.run(cache, trace_hash(iodir, args.binary_trace) if cache is not None else None)
+    print(search.report())
+
+
+def run_fork(args, iodir, config):
+    points = parse_sweep(args.sweep)
+    itrace = open_trace(iodir, jobs=args.jobs, binary=args.binary_trace, indexed=args.indexed)
+    fork = Fork(itrace, config, args.fork_at)
+    results = fork.run(points, iodir, jobs=args.jobs, binary=args.binary_trace, indexed=args.indexed)
+    print(fork.report())
+    print_sweep(points, results)
+
+
+def run_remap(args, iodir, config):
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_size)
+    results = run_remaps(
+        args.remap, config, iodir, jobs=args.jobs, binary=args.binary_trace,
+        cache=cache, tracehash=trace_hash(iodir, args.binary_trace) if cache is not None else None,
+        indexed=args.indexed,
+    )
+    print(remap_report(results))
+
+
+def run_timing(args, iodir, config):
+    # The run and sweep modes: simulate every config not in the result cache
+    footprint = Footprint() if args.mem_footprint else None
+    if args.mode == "sweep":
+        points = parse_sweep(args.sweep)
+        configs = [config.override(point) for point in points]
+    else:
+        configs = [config]
+    bounds = parse_slice(args.slice) if args.slice else None
+
+    # Cyclewise log, timeline, CPI stack, memory footprint, progress reports
+    # and incremental snapshots need a real simulation, so skip the cache
+    cache = None
+    results = [None for _ in configs]
+    if not args.no_cache and not (
+        args.cyclewise or args.timeline or args.cpistack or args.mem_footprint or args.progress > 0
+        or args.incremental
+    ):
+        cache = ResultCache(args.cache_dir, args.cache_size)
+        tracehash = trace_hash(iodir, args.binary_trace)
+        if args.slice:
+            tracehash += f"|slice:{bounds[0]}:{bounds[1]}"
+        keys = [ResultCache.key(tracehash, conf, args.engine) for conf in configs]
+        results = [cache.get(key) for key in keys]
+        for key, result in zip(keys, results):
+            if result is not None:
+                print("Cache - Result loaded for key:", key)
+
+    missing = [k for k in range(len(configs)) if results[k] is None]
+    if missing:
+        # Parse trace
+        itrace = open_trace(iodir, jobs=args.jobs, binary=args.binary_trace, indexed=args.indexed, bounds=bounds)
+        if footprint is not None:
+            footprint.phase("load")
+        if args.engine == "jit":
+            if not COMPILED:
+                print("JitCore - Numba is not installed, running the engine interpreted")
+            counters = []
+            for k in missing:
+                jcore = JitCore(itrace, configs[k])
+                jcore.run()
+                counters.append(jcore.counters())
+            if footprint is not None:
+                footprint.phase("run")
+        elif args.mode == "sweep":
+            # Simulate every uncached point over the shared trace
+            counters = []
+            for k in missing:
+                vcore = Core(itrace, configs[k], iodir)
+                vcore.run()
+                counters.append(vcore.counters())
+            if footprint is not None:
+                footprint.phase("run")
+        else:
+            # Create Vector Core
+            # The CPI stack is accounted by the timeline
+            snapshots = None
+            if args.incremental:
+                if not os.path.isfile(os.path.join(iodir, "trace.txt")):
+                    raise Exception("Incremental - ERROR: --incremental needs trace.txt in the IO directory")
+                snapshots = Snapshots(iodir, config, args.snapshot_interval)
+            vcore = Core(
+                itrace, config, iodir, cyclewise=args.cyclewise, timeline=args.timeline or args.cpistack,
+                progress=Progress(args.progress, args.metrics_file) if args.progress > 0 else None,
+                snapshots=snapshots,
+            )
+            if snapshots is not None:
+                snapshots.resume(vcore)
+
+            # Run Core
+            try:
+                vcore.run()
+            except Runaway as e:
+                print(e, file=sys.stderr)
+                exit(1)
+            if footprint is not None:
+                footprint.phase("run")
+            if snapshots is not None:
+                snapshots.save()
+            if args.timeline:
+                vcore.timeline.dump(iodir)
+            if args.cpistack:
+                CPIStack(vcore.timeline, itrace, vcore.cycle).dump(iodir)
+            counters = [vcore.counters()]
+        if footprint is not None:
+            footprint.phase("dump")
+            footprint.dump(iodir)
+            print(footprint.report())
+
+        for k, result in zip(missing, counters):
+            results[k] = result
+            if cache is not None:
+                cache.put(keys[k], result)
+
+    if args.mode == "sweep":
+        print_sweep(points, results)
+    else:
+        print("Cycles:", results[0]["cycles"])
+
+
+MODES = {
+    "run": run_timing,
+    "sweep": run_timing,
+    "estimate": run_estimate,
+    "search": run_search,
+    "fork": run_fork,
+    "remap": run_remap,
+    "cores": run_cores,
+}
 
 if __name__ == "__main__":
     # parse arguments for input file location
     parser = argparse.ArgumentParser(description="Vector Core Timing Model")
+    parser.add_argument(
+        "--mode",
+        default="run",
+        choices=list(MODES),
+        help="What to simulate: run one config, sweep, estimate, search or fork over the --sweep grid, "
+        "compare --remap layouts, or the scaling of --cores cores",
+    )
     parser.add_argument(
         "--iodir",
         default="",
@@ -14,20 +275,122 @@ if __name__ == "__main__":
         help="Path to the folder containing the input files - instructions and data.",
     )
     parser.add_argument("--cyclewise", default=False, action="store_true", help="Generate cycle-wise pipeline log")
+    parser.add_argument(
+        "--timeline",
+        default=False,
+        action="store_true",
+        help="Generate per instruction pipeline timeline as Chrome trace JSON and Konata log",
+    )
+    parser.add_argument(
+        "--cpistack",
+        default=False,
+        action="store_true",
+        help="Generate cycle accounting (CPI stack) per static instruction and loop",
+    )
+    parser.add_argument(
+        "--progress",
+        default=0,
+        type=float,
+        help="Report progress every PROGRESS seconds to stderr, and abort on a stalled pipeline",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        type=str,
+        help="Also write progress metrics to this file, Prometheus text format if it ends in .prom, else JSON lines",
+    )
+    parser.add_argument("--no-cache", default=False, action="store_true", help="Always simulate, do not use the result cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, type=str, help="Folder of the result cache")
+    parser.add_argument("--cache-size", default=1024, type=int, help="Maximum number of cached results")
+    parser.add_argument(
+        "--sweep",
+        default=[],
+        action="append",
+        help="Sweep a config parameter over values, e.g. numLanes=2,4,8. Can be repeated for a grid.",
+    )
+    parser.add_argument(
+        "--binary-trace",
+        default=False,
+        action="store_true",
+        help="Load trace.bin if up to date, else parse trace.txt and write trace.bin",
+    )
+    parser.add_argument(
+        "--jobs",
+        default=1,
+        type=int,
+        help="Worker processes used to parse the trace, and to simulate in the search, fork and remap modes",
+    )
+    parser.add_argument("--eta", default=3, type=int, help="Fraction 1/eta of candidates kept by each search rung")
+    parser.add_argument(
+        "--area",
+        default="numLanes,vdmNumBanks",
+        type=str,
+        help="Config parameters whose product is the area proxy of the search",
+    )
+    parser.add_argument(
+        "--engine",
+        default="python",
+        choices=["python", "jit"],
+        help="Cycle loop engine, jit runs it as Numba compiled code over the encoded trace",
+    )
+    parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="Resume from the snapshot of a previous run taken before the first changed trace line",
+    )
+    parser.add_argument("--snapshot-interval", default=20000, type=int, help="Instructions between --incremental snapshots")
+    parser.add_argument(
+        "--cores",
+        default=1,
+        type=int,
+        help="Simulate up to this many cores sharing the VDMEM banks, core i runs trace_i.txt, and report cycle scaling",
+    )
+    parser.add_argument(
+        "--quantum",
+        default=100,
+        type=int,
+        help="Cycles between synchronizations of the core worker processes, 0 steps all cores exactly in one process",
+    )
+    parser.add_argument(
+        "--remap",
+        default=[],
+        action="append",
+        help="Address layout of the vector loads and stores, e.g. pad:0-4096:64:1 or xor:4, "
+        "repeat to compare layouts on --jobs processes",
+    )
+    parser.add_argument(
+        "--indexed",
+        default=False,
+        action="store_true",
+        help="Read trace records on demand through the trace.idx record index instead of loading the whole trace",
+    )
+    parser.add_argument(
+        "--slice",
+        default=None,
+        type=str,
+        help="Only time the instructions START:END of the trace, from an empty pipeline, e.g. 50000:60000",
+    )
+    parser.add_argument(
+        "--mem-footprint",
+        default=False,
+        action="store_true",
+        help="Trace memory allocations and write the memory per subsystem after load, run and dump to footprint.json",
+    )
+    parser.add_argument(
+        "--fork-at",
+        default=None,
+        type=int,
+        help="Simulate the base config up to this cycle once, then continue from there with every --sweep point",
+    )
     args = parser.parse_args()
+    check_options(parser, args)
 
     iodir = os.path.abspath(args.iodir)
     print("IO Directory:", iodir)
 
     # Parse Config
     config = Config(iodir)
-    # Parse trace
-    itrace = ITrace(iodir)
-    # Create Vector Core
-    vcore = Core(itrace, config, iodir, cyclewise=args.cyclewise)
-
-    # Run Core
-    cycles_taken = vcore.run()
-    print("Cycles:", cycles_taken)
+    MODES[args.mode](args, iodir, config)
 
     # THE END
@@ -0,0 +1,222 @@
+import pickle
+from multiprocessing import Process, Pipe
+
+from itrace import ITrace
+from core import Core
+from incremental import core_state
+
+
+class LockstepSystem(object):
+    # N timing cores stepped together in one process, contending for the
+    # banks of one shared bank busyboard. Every cycle the cores step in turn,
+    # starting from a different core every cycle, so no core always wins a
+    # bank freed in the same cycle.
+    def __init__(self, itraces, config, iodir):
+        self.cores = [Core(itrace, config, iodir) for itrace in itraces]
+        shared = self.cores[0].bank_busyboard
+        for core in self.cores[1:]:
+            core.bank_busyboard = shared
+
+    def run(self):
+        cores = self.cores
+        n = len(cores)
+        orders = [[(start + k) % n for k in range(n)] for start in range(n)]
+        done = [core.done() for core in cores]
+        cycle = 0
+        while not all(done):
+            for k in orders[cycle % n]:
+                if not done[k]:
+                    cores[k].step()
+                    done[k] = cores[k].done()
+            cycle += 1
+        return [core.counters() for core in cores]
+
+
+class BankView(object):
+    # Bank busyboard of one core of a QuantumSystem. A bank is free if neither
+    # this core nor, per foreign, another core holds it. Core.backend_mem only
+    # sees the indexing, so it runs unchanged.
+    def __init__(self, banks):
+        self.own = [True for _ in range(banks)]
+        # Bit mask of the banks held by the other cores, as this core sees them
+        self.foreign = 0
+
+    def __getitem__(self, bank):
+        return self.own[bank] and not (self.foreign >> bank) & 1
+
+    def __setitem__(self, bank, free):
+        self.own[bank] = free
+
+    def held(self):
+        mask = 0
+        for bank, free in enumerate(self.own):
+            if not free:
+                mask |= 1 << bank
+        return mask
+
+
+def run_worker(conn, iodir, name, config, binary):
+    # One core of a QuantumSystem, in its own process. A list of foreign bank
+    # masks, one per cycle, runs the next quantum from the state at its start
+    # and answers the banks held at the end of every cycle. "commit" makes the
+    # state at the end of the last run the start of the next quantum.
+    core = Core(ITrace(iodir, binary=binary, name=name), config, iodir)
+    banks = BankView(config.vdmNumBanks)
+    core.bank_busyboard = banks
+
+    def save():
+        # The bank busyboard is the BankView, its own banks are saved instead
+        state = core_state(core, skip=("bank_busyboard",))
+        return pickle.dumps((state, banks.own), protocol=pickle.HIGHEST_PROTOCOL)
+
+    start = save()
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        if msg == "commit":
+            start = save()
+            continue
+        state, own = pickle.loads(start)
+        core.__dict__.update(state)
+        banks.own = own
+        held = []
+        for mask in msg:
+            if core.done():
+                break
+            banks.foreign = mask
+            core.step()
+            held.append(banks.held())
+        conn.send((held, core.done(), core.counters()))
+    conn.close()
+
+
+class QuantumSystem(object):
+    # N timing cores, each simulated in its own worker process, synchronized
+    # every `quantum` cycles. Within a quantum a core needs the banks held by
+    # the other cores in every cycle, which are only known once they ran it.
+    # So all workers run the quantum on a guess of the others' bank timelines,
+    # then again on the timelines they answered, until no timeline changes.
+    # Every run fixes at least one more cycle, as a cycle only depends on
+    # earlier ones, and the fixed point is the LockstepSystem result.
+    def __init__(self, iodir, names, config, quantum=100, binary=False):
+        self.names = names
+        self.quantum = quantum
+        self.conns = []
+        self.workers = []
+        # Runs of a quantum, over all quanta
+        self.runs = 0
+        self.quanta = 0
+        for name in names:
+            conn, child = Pipe()
+            worker = Process(target=run_worker, args=(child, iodir, name, config, binary))
+            worker.start()
+            self.conns.append(conn)
+            self.workers.append(worker)
+
+    def views(self, k, held, last, cycle):
+        # Foreign bank masks of core k in every cycle of the quantum, with
+        # the bank state LockstepSystem shows it: cores stepping before it in
+        # that cycle at the end of the cycle, the others at the end of the
+        # previous one
+        n = len(self.names)
+        masks = []
+        for t in range(self.quantum):
+            start = (cycle + t) % n
+            pos = (k - start) % n
+            mask = 0
+            for j, hj in held.items():
+                if j == k:
+                    continue
+                if (j - start) % n < pos:
+                    mask |= hj[t]
+                else:
+                    mask |= hj[t - 1] if t > 0 else last[j]
+            masks.append(mask)
+        return masks
+
+    def run(self):
+        n = len(self.names)
+        quantum = self.quantum
+        counters = [None] * n
+        # Banks held by every core at the end of the last quantum
+        last = [0] * n
+        active = list(range(n))
+        cycle = 0
+        while active:
+            # First guess, every core keeps the banks it holds
+            held = {k: [last[k]] * quantum for k in active}
+            while True:
+                for k in active:
+                    self.conns[k].send(self.views(k, held, last, cycle))
+                answers = {}
+                for k in active:
+                    hk, done, counters[k] = self.conns[k].recv()
+                    # A finished core holds no bank
+                    answers[k] = (hk + [0] * (quantum - len(hk)), done)
+                self.runs += 1
+                if all(answers[k][0] == held[k] for k in active):
+                    break
+                held = {k: answers[k][0] for k in active}
+            for k in active:
+                self.conns[k].send("commit")
+                last[k] = held[k][-1]
+            self.quanta += 1
+            cycle += quantum
+            active = [k for k in active if not answers[k][1]]
+        for conn, worker in zip(self.conns, self.workers):
+            conn.send(None)
+            worker.join()
+        return counters
+
+
+def scaling(iodir, num_cores, config, quantum, binary=False):
+    # Cycles of systems of 1, 2, 4, ... and num_cores cores, core i running
+    # trace_i.txt, against the cycles of every core running alone
+    names = [f"trace_{i}" for i in range(num_cores)]
+    itraces = [ITrace(iodir, binary=binary, name=name) for name in names] if quantum == 0 else None
+    alone = []
+    for i, name in enumerate(names):
+        core = Core(itraces[i] if itraces else ITrace(iodir, binary=binary, name=name), config, iodir)
+        core.run()
+        alone.append(core.counters())
+
+    counts = []
+    n = 1
+    while n < num_cores:
+        counts.append(n)
+        n *= 2
+    counts.append(num_cores)
+
+    rows = []
+    for n in counts:
+        # Quantum runs of the system and its quanta
+        runs = None
+        if n == 1:
+            counters = alone[:1]
+        elif quantum == 0:
+            counters = LockstepSystem(itraces[:n], config, iodir).run()
+        else:
+            system = QuantumSystem(iodir, names[:n], config, quantum, binary)
+            counters = system.run()
+            runs = (system.runs, system.quanta)
+        rows.append((n, counters, runs))
+    return alone, rows
+
+
+def report(alone, rows):
+    base_ipc = alone[0]["instructions"] / alone[0]["cycles"]
+    lines = [
+        "Core alone: " + " ".join(f"{i}:{counters['cycles']}" for i, counters in enumerate(alone)),
+        f"{'Cores':<8}{'Cycles':>10}{'Instructions':>14}{'IPC':>8}{'Speedup':>9}{'Max slowdown':>14}{'Runs/quantum':>14}",
+    ]
+    for n, counters, runs in rows:
+        cycles = max(c["cycles"] for c in counters)
+        instructions = sum(c["instructions"] for c in counters)
+        ipc = instructions / cycles
+        slowdown = max(c["cycles"] / alone[i]["cycles"] for i, c in enumerate(counters))
+        reruns = f"{runs[0] / runs[1]:.2f}" if runs else "-"
+        lines.append(
+            f"{n:<8}{cycles:>10}{instructions:>14}{ipc:>8.2f}{ipc / base_ipc:>9.2f}{slowdown:>14.2f}{reruns:>14}"
+        )
+    return "\n".join(lines)
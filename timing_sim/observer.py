@@ -0,0 +1,64 @@
+import os
+import sys
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from hooks import bind
+
+
+class Observer(object):
+    # Events of the timing Core. An observer overrides the events it needs
+    # and is passed to the Core, which binds the overridden events once when
+    # it is created, see hook(). Events nobody overrides cost the Core a test
+    # of an attribute, and their arguments are not evaluated.
+
+    def fetched(self, ins, cycle):
+        pass
+
+    def decoded(self, ins, cycle):
+        # Passed on from decode to a dispatch queue or the scalar slot
+        pass
+
+    def dispatched(self, ins, cycle, unit):
+        # Sent to a backend unit, one of timeline.UNITS
+        pass
+
+    def stalled(self, ins, cause):
+        # One cycle of stall, one of timeline.STALL_CAUSES
+        pass
+
+    def completed(self, ins, cycle):
+        pass
+
+    def stage(self, *args):
+        # Contents of a pipeline stage, as printed in the cyclewise log
+        pass
+
+    def tick(self, core):
+        # End of a cycle, core.cycle is the number of cycles simulated
+        pass
+
+    def finish(self, core):
+        # End of the run
+        pass
+
+
+def hook(observers, event):
+    # The call of `event` on all observers which override it,
+    # None if there are none
+    return bind(Observer, observers, event)
+
+
+class CyclewiseLog(Observer):
+    # Cycle-wise pipeline state log, cyclewise.log in the IO directory
+    def __init__(self, filepath):
+        self.file = open(filepath, "w")
+
+    def stage(self, *args):
+        print(*args, file=self.file)
+
+    def finish(self, core):
+        self.file.close()
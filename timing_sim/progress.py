@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+# Modules shared by both simulators
+COMMON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from observer import Observer
+from telemetry import rss_bytes, Runaway, MetricsFile
+
+# Cycles between two samples of the clock, a power of 2 minus 1 as mask
+SAMPLE_MASK = 0xFFF
+
+
+class Progress(Observer):
+    # Periodic progress report of the timing Core.
+    # sample() runs every SAMPLE_MASK + 1 cycles, and only reads
+    # the clock until `interval` seconds passed since the last report.
+    # Reports go to stderr and, if given, to a metrics file, see MetricsFile.
+    # A pipeline which fetches no instruction for `stall_limit` cycles is
+    # deadlocked, as no instruction occupies a unit that long, so the run is aborted.
+    def __init__(self, interval, metrics_file=None, stall_limit=1000000):
+        self.interval = interval
+        self.metrics_file = None if metrics_file is None else MetricsFile(metrics_file, "vmips_timing_")
+        self.stall_limit = stall_limit
+        self.start = time.monotonic()
+        self.last_time = self.start
+        self.last_count = 0
+        self.last_cycle = 0
+        self.fetch_count = 0
+        self.fetch_cycle = 0
+
+    def tick(self, core):
+        if not (core.cycle & SAMPLE_MASK):
+            self.sample(core)
+
+    def sample(self, core):
+        if core.count != self.fetch_count:
+            self.fetch_count = core.count
+            self.fetch_cycle = core.cycle
+        elif core.cycle - self.fetch_cycle > self.stall_limit:
+            raise Runaway(
+                f"Progress - ERROR: No instruction fetched for {core.cycle - self.fetch_cycle} cycles,"
+                f" pipeline stalled at instruction {core.decode_ins}"
+            )
+        now = time.monotonic()
+        if now - self.last_time >= self.interval:
+            self.report(core, now)
+
+    def report(self, core, now, final=False):
+        elapsed = now - self.start
+        period = max(now - self.last_time, 1e-9)
+        ins = core.decode_ins
+        metrics = {
+            "instructions": core.count,
+            "cycles": core.cycle,
+            "instructions_per_second": (core.count - self.last_count) / period,
+            "cycles_per_second": (core.cycle - self.last_cycle) / period,
+            "pc": ins.pc if ins is not None and ins.pc is not None else -1,
+            "rss_bytes": rss_bytes(),
+            "elapsed_seconds": elapsed,
+        }
+        self.last_time, self.last_count, self.last_cycle = now, core.count, core.cycle
+        print(
+            f"Progress - {'Done' if final else 'Running'} {elapsed:.1f}s: instructions {core.count}"
+            f" ({metrics['instructions_per_second']:.0f}/s), cycles {core.cycle}"
+            f" ({metrics['cycles_per_second']:.0f}/s), PC {metrics['pc']}, RSS {metrics['rss_bytes'] >> 20} MB",
+            file=sys.stderr,
+        )
+        if self.metrics_file is not None:
+            self.metrics_file.write(metrics, final)
+
+    def finish(self, core):
+        self.report(core, time.monotonic(), final=True)
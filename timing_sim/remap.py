@@ -0,0 +1,124 @@
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from core import Core
+from cache import ResultCache
+from search import WORKER, init_worker
+
+
+def parse_range(text):
+    start, end = text.split("-")
+    return int(start), int(end)
+
+
+class Remap(object):
+    # VDMEM address remapping of the vector loads and stores of a trace,
+    # applied by the Core when it dispatches them, to try data layouts
+    # without running the functional simulator again. A spec is a comma
+    # separated list of rules applied in order:
+    #   offset:S-E:D        addresses in [S, E) move by D words
+    #   pad:S-E:ROW:PAD     the region [S, E) is rows of ROW words, every row
+    #                       moves by PAD words more than the one before it
+    #   xor:SHIFT           bank interleave hash, the bank of address a is
+    #                       xored with (a >> SHIFT), banks must be a power of 2
+    #                       and SHIFT at least log2(banks), so the bank bits
+    #                       are not xored with themselves
+    #   table:FILE          lines "S E NEWSTART" move [S, E) to NEWSTART
+    # Only timing changes, the values of the trace are not checked against
+    # the new layout.
+    def __init__(self, spec, banks):
+        self.spec = spec
+        self.rules = []
+        for rule in spec.split(","):
+            kind, _, args = rule.partition(":")
+            fields = args.split(":") if args else []
+            if kind == "offset" and len(fields) == 2:
+                start, end = parse_range(fields[0])
+                self.rules.append(("move", [(start, end, int(fields[1]))]))
+            elif kind == "table" and len(fields) == 1:
+                moves = []
+                with open(fields[0], "r") as tf:
+                    for line in tf:
+                        if line.strip() and not line.lstrip().startswith("#"):
+                            start, end, newstart = map(int, line.split())
+                            moves.append((start, end, newstart - start))
+                self.rules.append(("move", moves))
+            elif kind == "pad" and len(fields) == 3:
+                start, end = parse_range(fields[0])
+                self.rules.append(("pad", start, end, int(fields[1]), int(fields[2])))
+            elif kind == "xor" and len(fields) == 1:
+                if banks & (banks - 1):
+                    raise Exception(f"Remap - ERROR: xor needs a power of 2 banks, not {banks}")
+                shift = int(fields[0])
+                if shift < banks.bit_length() - 1:
+                    raise Exception(f"Remap - ERROR: xor shift {shift} overlaps the bank bits, use at least {banks.bit_length() - 1}")
+                self.rules.append(("xor", shift, banks - 1))
+            else:
+                raise Exception(f"Remap - ERROR: Invalid rule: {rule}")
+
+    def address(self, addr):
+        for rule in self.rules:
+            if rule[0] == "move":
+                # The first region containing the address moves
+                for start, end, delta in rule[1]:
+                    if start <= addr < end:
+                        addr += delta
+                        break
+            elif rule[0] == "pad":
+                _, start, end, row, pad = rule
+                if start <= addr < end:
+                    addr += (addr - start) // row * pad
+            else:
+                _, shift, mask = rule
+                addr ^= (addr >> shift) & mask
+        return addr
+
+    def digest(self):
+        # Hash of the parsed rules, it changes with the contents of table files
+        return hashlib.sha256(repr(self.rules).encode()).hexdigest()
+
+    def __call__(self, addrs):
+        address = self.address
+        return [address(addr) for addr in addrs]
+
+
+def simulate(spec):
+    # Cycles of the trace of a search.init_worker process with one remap
+    config = WORKER["config"]
+    vcore = Core(WORKER["itrace"], config, "", remap=Remap(spec, config.vdmNumBanks) if spec else None)
+    vcore.run()
+    return vcore.counters()
+
+
+def run_remaps(specs, config, iodir, jobs=1, binary=False, cache=None, tracehash=None, indexed=False):
+    # Cycles of the trace without remapping and with every spec, simulated on
+    # a process pool, every worker loads the trace once
+    specs = [""] + specs
+    # Invalid specs fail here, not in a worker
+    remaps = {spec: Remap(spec, config.vdmNumBanks) for spec in specs[1:]}
+    results = {}
+    keys = {}
+    if cache is not None:
+        for spec in specs:
+            keys[spec] = ResultCache.key(f"{tracehash}|remap:{remaps[spec].digest() if spec else ''}", config)
+            result = cache.get(keys[spec])
+            if result is not None:
+                results[spec] = result
+    missing = [spec for spec in specs if spec not in results]
+    if missing:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(iodir, binary, indexed)) as pool:
+            for spec, result in zip(missing, pool.map(simulate, missing)):
+                results[spec] = result
+                if cache is not None:
+                    cache.put(keys[spec], result)
+    return [(spec, results[spec]) for spec in specs]
+
+
+def report(results):
+    base = results[0][1]["cycles"]
+    lines = []
+    for spec, result in results:
+        cycles = result["cycles"]
+        delta = f" ({cycles - base:+d}, {100.0 * (cycles - base) / base:+.1f}%)" if spec else ""
+        lines.append(f"Remap: {spec or 'none'} Cycles: {cycles}{delta}")
+    return "\n".join(lines)
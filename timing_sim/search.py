@@ -0,0 +1,143 @@
+import os
+from math import ceil
+from concurrent.futures import ProcessPoolExecutor
+
+from itrace import ITrace, HALT
+from tracefile import IndexedTrace
+from core import Core, Config
+from estimate import Estimator
+from cache import ResultCache
+
+# Trace and config of a worker process, loaded once by init_worker
+WORKER = {}
+
+
+class PrefixTrace(object):
+    # First `length` instructions of a trace, followed by HALT
+    def __init__(self, itrace, length):
+        self.itrace = itrace
+        self.length = length
+
+    def __len__(self):
+        return min(self.length, len(self.itrace))
+
+    def Read(self, idx):
+        if idx < self.length:
+            return self.itrace.Read(idx)
+        return HALT
+
+
+def init_worker(iodir, binary, indexed=False):
+    # Indexed traces are read in place, so the workers share the file pages
+    WORKER["itrace"] = IndexedTrace(iodir) if indexed else ITrace(iodir, binary=binary)
+    WORKER["config"] = Config(iodir)
+
+
+def simulate(params, length):
+    # Cycles of one config on a prefix of the trace, or on all of it
+    itrace = WORKER["itrace"]
+    if length is not None and length < len(itrace):
+        itrace = PrefixTrace(itrace, length)
+    vcore = Core(itrace, WORKER["config"].override(params), "")
+    vcore.run()
+    return vcore.counters()
+
+
+def pareto(scores, areas):
+    # Candidates no other candidate beats in both area and cycles
+    front = []
+    best = None
+    for k in sorted(scores, key=lambda k: (areas[k], scores[k])):
+        if best is None or scores[k] < best:
+            front.append(k)
+            best = scores[k]
+    return front
+
+
+class Search(object):
+    # Successive halving over the points of a sweep grid.
+    # Every rung scores the remaining candidates with a cheaper model, first the
+    # analytic estimate, then cycle-exact simulation of growing trace prefixes,
+    # and keeps the best 1/eta by cycles together with the area/cycles Pareto
+    # front, so small configs are not pruned only for being slower.
+    # The survivors of the last rung are simulated on the full trace.
+    def __init__(self, itrace, config, points, iodir, eta=3, area=("numLanes", "vdmNumBanks"), jobs=1, binary=False, indexed=False):
+        self.ITrace = itrace
+        self.config = config
+        self.points = points
+        self.iodir = iodir
+        self.eta = eta
+        self.jobs = jobs
+        self.binary = binary
+        self.indexed = indexed
+        self.areas = []
+        for point in points:
+            conf = config.override(point)
+            value = 1
+            for param in area:
+                value *= getattr(conf, param)
+            self.areas.append(value)
+        # Description and number of candidates of every rung
+        self.rungs = []
+        self.simulated = 0
+        self.cached = 0
+
+    def prune(self, candidates, scores):
+        keep = set(sorted(candidates, key=lambda k: scores[k])[: ceil(len(candidates) / self.eta)])
+        keep.update(pareto({k: scores[k] for k in candidates}, self.areas))
+        return sorted(keep)
+
+    def run(self, cache=None, tracehash=None):
+        candidates = list(range(len(self.points)))
+        scores = {k: Estimator(self.ITrace, self.config.override(self.points[k])).run() for k in candidates}
+        self.rungs.append(("estimate", len(candidates)))
+        candidates = self.prune(candidates, scores)
+
+        results = {}
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker, initargs=(self.iodir, self.binary, self.indexed)) as pool:
+            # Prefixes of 1/eta^r of the trace, shortest first
+            lengths = []
+            length = len(self.ITrace) // self.eta
+            while length >= 1000 and len(lengths) < 3:
+                lengths.insert(0, length)
+                length //= self.eta
+            for length in lengths:
+                if len(candidates) <= self.eta:
+                    break
+                futures = {k: pool.submit(simulate, self.points[k], length) for k in candidates}
+                scores = {k: future.result()["cycles"] for k, future in futures.items()}
+                self.rungs.append((f"prefix {length}", len(candidates)))
+                candidates = self.prune(candidates, scores)
+
+            # Full cycle-exact simulation of the survivors
+            self.rungs.append(("full", len(candidates)))
+            futures = {}
+            for k in candidates:
+                key = ResultCache.key(tracehash, self.config.override(self.points[k])) if cache is not None else None
+                result = cache.get(key) if cache is not None else None
+                if result is not None:
+                    results[k] = result
+                    self.cached += 1
+                else:
+                    futures[k] = (key, pool.submit(simulate, self.points[k], None))
+            for k, (key, future) in futures.items():
+                results[k] = future.result()
+                self.simulated += 1
+                if cache is not None:
+                    cache.put(key, results[k])
+        self.results = results
+        return results
+
+    def report(self):
+        lines = ["Search rungs: " + ", ".join(f"{name} {count}" for name, count in self.rungs)]
+        avoided = len(self.points) - self.simulated - self.cached
+        lines.append(
+            f"Full simulations: {self.simulated} run, {self.cached} cached, "
+            f"{avoided} avoided of {len(self.points)} candidates"
+        )
+        cycles = {k: result["cycles"] for k, result in self.results.items()}
+        lines.append("Best config per area:")
+        for k in pareto(cycles, self.areas):
+            params = " ".join(f"{key}={val}" for key, val in self.points[k].items())
+            lines.append(f"  Area: {self.areas[k]:<8} Cycles: {cycles[k]:<10} {params}")
+        return "\n".join(lines)
@@ -0,0 +1,16 @@
+from itertools import product
+
+
+def parse_sweep(specs):
+    # Parse sweep specs of the form "param=v1,v2,..." and return the
+    # list of parameter overrides for every point of the grid.
+    names = []
+    values = []
+    for spec in specs:
+        if "=" not in spec:
+            raise ValueError(f"Invalid sweep spec, expected param=v1,v2,...: {spec}")
+        key, vals = spec.split("=", 1)
+        names.append(key.strip())
+        values.append([int(v) for v in vals.split(",")])
+    return [dict(zip(names, point)) for point in product(*values)]
+
@@ -0,0 +1,188 @@
+import os
+import json
+from array import array
+
+from observer import Observer
+
+# Backend units, the unit of an instruction is stored as index in this list
+UNITS = ["scalar", "mem", "mul", "div", "add"]
+# Causes of the cycles an instruction waits, charged to the waiting instruction:
+# raw           - operands busy, held in decode
+# queue_full    - dispatch queue or scalar slot full, held in decode
+# unit_busy     - head of its queue but the backend unit is busy
+# arbitration   - unit free but another queue won the single dispatch slot
+# bank_conflict - an address of a load/store waits for its bank
+STALL_CAUSES = ["raw", "queue_full", "unit_busy", "arbitration", "bank_conflict"]
+# Cycle accounting categories, base is a cycle the instruction made progress
+CPI_CAUSES = ["base"] + STALL_CAUSES
+
+
+class Timeline(Observer):
+    # Per instruction pipeline timeline of a timing run.
+    # Cycles of every stage are kept in compact arrays indexed by the
+    # dynamic instruction index (Instruction.idx), -1 if not reached.
+    FIELDS = ["fetch", "decode_enter", "decode_leave", "dispatch", "backend_start", "complete"]
+
+    def __init__(self):
+        for field in Timeline.FIELDS:
+            setattr(self, field, array("i"))
+        self.unit = array("b")
+        self.stalls = {cause: array("i") for cause in STALL_CAUSES}
+        # Static PC, -1 for traces without PC
+        self.pc = array("i")
+        # Cycles charged to the instruction, see tick()
+        self.charged = {cause: array("i") for cause in CPI_CAUSES}
+        # Instruction in decode this cycle and its stall cause
+        self.head = None
+        self.head_cause = None
+        # Oldest instruction not completed and its stall cause this cycle
+        self.oldest = 0
+        self.oldest_cause = None
+        # Cycles with no instruction in flight
+        self.idle = 0
+        # Instruction text, interned so identical instructions share one string
+        self.label = array("i")
+        self.label_table = []
+        self.label_ids = {}
+
+    def __len__(self):
+        return len(self.fetch)
+
+    def fetched(self, ins, cycle):
+        # Instructions are fetched in order, so they are appended here
+        if ins.idx < 0:
+            return
+        for field in Timeline.FIELDS:
+            getattr(self, field).append(-1)
+        self.unit.append(-1)
+        for cause in STALL_CAUSES:
+            self.stalls[cause].append(0)
+        for cause in CPI_CAUSES:
+            self.charged[cause].append(0)
+        self.pc.append(ins.pc if ins.pc is not None else -1)
+        text = " ".join([ins.opcode] + [str(op) for op in ins.ops if op is not None])
+        if text not in self.label_ids:
+            self.label_ids[text] = len(self.label_table)
+            self.label_table.append(text)
+        self.label.append(self.label_ids[text])
+        self.fetch[ins.idx] = cycle
+        # Decode stage sees the instruction from the next cycle
+        self.decode_enter[ins.idx] = cycle + 1
+
+    def decoded(self, ins, cycle):
+        if ins.idx >= 0:
+            self.decode_leave[ins.idx] = cycle
+            self.head = ins.idx
+
+    def dispatched(self, ins, cycle, unit):
+        if ins.idx >= 0:
+            self.dispatch[ins.idx] = cycle
+            # Backend stage runs the unit from the next cycle
+            self.backend_start[ins.idx] = cycle + 1
+            self.unit[ins.idx] = UNITS.index(unit)
+
+    def completed(self, ins, cycle):
+        if ins.idx >= 0:
+            self.complete[ins.idx] = cycle
+
+    def stalled(self, ins, cause):
+        # One cycle of stall of the instruction
+        if ins.idx >= 0:
+            self.stalls[cause][ins.idx] += 1
+            if cause == "raw" or cause == "queue_full":
+                self.head = ins.idx
+                self.head_cause = cause
+            elif ins.idx == self.oldest:
+                self.oldest_cause = cause
+
+    def tick(self, core):
+        # End of a cycle, charge it to the head of the in-order pipeline:
+        # the instruction in decode, as base if it was passed on, else as its
+        # stall cause. Without one, as while draining, charge it to the oldest
+        # instruction not completed.
+        if self.head is not None:
+            self.charged[self.head_cause or "base"][self.head] += 1
+        elif self.oldest < len(self.fetch):
+            self.charged[self.oldest_cause or "base"][self.oldest] += 1
+        else:
+            self.idle += 1
+        self.head = self.head_cause = self.oldest_cause = None
+        complete = self.complete
+        while self.oldest < len(complete) and complete[self.oldest] >= 0:
+            self.oldest += 1
+
+    def text(self, idx):
+        return self.label_table[self.label[idx]]
+
+    def stages(self, idx):
+        # Stage spans (name, start, end) of an instruction, end is exclusive.
+        # A stage holds the instruction until the cycle after it is passed on.
+        spans = [
+            ("fetch", self.fetch[idx], self.decode_enter[idx]),
+            ("decode", self.decode_enter[idx], self.decode_leave[idx] + 1),
+            ("queue", self.decode_leave[idx] + 1, self.dispatch[idx] + 1),
+        ]
+        if self.unit[idx] >= 0:
+            spans.append((UNITS[self.unit[idx]], self.backend_start[idx], self.complete[idx] + 1))
+        return [span for span in spans if span[1] >= 0 and span[2] > 0]
+
+    def dump_chrome(self, filepath):
+        # Chrome trace-event JSON, one cycle is shown as one microsecond.
+        # Decode and backend units are tracks, instructions waiting in the
+        # queues overlap so they are async events.
+        tracks = ["decode"] + UNITS
+        with open(filepath, "w") as opf:
+            opf.write('{"traceEvents": [\n')
+            events = [
+                json.dumps({"ph": "M", "name": "thread_name", "pid": 0, "tid": tid, "args": {"name": name}})
+                for tid, name in enumerate(tracks)
+            ]
+            for idx in range(len(self)):
+                name = f"{idx}: {self.text(idx)}"
+                for stage, start, end in self.stages(idx):
+                    if stage == "fetch":
+                        continue
+                    if stage == "queue":
+                        if end > start:
+                            args = {"name": name, "cat": "queue", "id": idx, "pid": 0, "tid": 0}
+                            events.append(json.dumps(dict(args, ph="b", ts=start)))
+                            events.append(json.dumps(dict(args, ph="e", ts=end)))
+                        continue
+                    events.append(json.dumps({
+                        "name": name, "cat": stage, "ph": "X", "pid": 0,
+                        "tid": tracks.index(stage), "ts": start, "dur": end - start,
+                    }))
+            opf.write(",\n".join(events))
+            opf.write("\n]}\n")
+        print("Timeline - Chrome trace written to file:", filepath)
+
+    def dump_konata(self, filepath):
+        # Kanata log format, loadable in the Konata pipeline viewer
+        events = []
+        for idx in range(len(self)):
+            spans = self.stages(idx)
+            events.append((self.fetch[idx], 0, idx, f"I\t{idx}\t{idx}\t0"))
+            events.append((self.fetch[idx], 1, idx, f"L\t{idx}\t0\t{self.text(idx)}"))
+            for stage, start, end in spans:
+                if end <= start:
+                    continue
+                events.append((start, 3, idx, f"S\t{idx}\t0\t{stage}"))
+                events.append((end, 2, idx, f"E\t{idx}\t0\t{stage}"))
+            if self.complete[idx] >= 0:
+                events.append((self.complete[idx] + 1, 4, idx, f"R\t{idx}\t{idx}\t0"))
+        events.sort()
+
+        with open(filepath, "w") as opf:
+            lines = ["Kanata\t0004", "C=\t0"]
+            cycle = 0
+            for ev_cycle, _, _, line in events:
+                if ev_cycle > cycle:
+                    lines.append(f"C\t{ev_cycle - cycle}")
+                    cycle = ev_cycle
+                lines.append(line)
+            opf.write("\n".join(lines) + "\n")
+        print("Timeline - Konata log written to file:", filepath)
+
+    def dump(self, iodir):
+        self.dump_chrome(os.path.abspath(os.path.join(iodir, "timeline.json")))
+        self.dump_konata(os.path.abspath(os.path.join(iodir, "timeline.kanata.log")))
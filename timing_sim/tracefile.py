@@ -0,0 +1,186 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+from array import array
+from collections import OrderedDict
+
+from itrace import ITrace, Instruction, StaticInstruction, TRACE_RE, HALT
+
+
+class IndexedTrace(object):
+    # Instruction trace read in place from trace.txt, for traces too large to
+    # load. A sidecar index, trace.idx, holds the byte offset of every record,
+    # so Read(idx) decodes record idx on demand from the memory mapped file.
+    # The index is memory mapped too, so memory stays flat however long the
+    # trace is, and worker processes opening the same trace share its pages.
+    # The last `cache_size` decoded records are kept, as readers jumping
+    # around the trace often read the same records again. Static instructions
+    # are interned per trace, by StaticInstruction.key.
+    IDX_MAGIC = b"VMIPSIDX"
+    IDX_VERSION = 1
+    # Version, byteorder (0 little, 1 big), records, trace size and mtime
+    IDX_HEADER = struct.Struct("<5q")
+
+    def __init__(self, iodir, name="trace", cache_size=4096):
+        self.filepath = os.path.abspath(os.path.join(iodir, name + ".txt"))
+        self.idxpath = os.path.abspath(os.path.join(iodir, name + ".idx"))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.static_table = {}
+        if not os.path.isfile(self.filepath):
+            raise Exception(f"IndexedTrace - ERROR: Trace file not found: {self.filepath}")
+        if not self.valid_index():
+            self.build_index()
+            print("IndexedTrace - Index written to file:", self.idxpath)
+
+        self.mm = None
+        self.offsets = ()
+        with open(self.filepath, "rb") as tf:
+            if os.path.getsize(self.filepath):
+                self.mm = mmap.mmap(tf.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(self.idxpath, "rb") as idxf:
+            self.idxmm = mmap.mmap(idxf.fileno(), 0, access=mmap.ACCESS_READ)
+        count = self.read_header()[2]
+        if count:
+            start = len(IndexedTrace.IDX_MAGIC) + IndexedTrace.IDX_HEADER.size
+            self.offsets = memoryview(self.idxmm)[start : start + 8 * count].cast("q")
+        print("IndexedTrace - Instruction trace opened from file:", self.filepath)
+
+    def read_header(self, data=None):
+        data = self.idxmm if data is None else data
+        return IndexedTrace.IDX_HEADER.unpack_from(data, len(IndexedTrace.IDX_MAGIC))
+
+    def stamp(self):
+        stat = os.stat(self.filepath)
+        return stat.st_size, stat.st_mtime_ns
+
+    def valid_index(self):
+        # The index is valid for the trace it was built from, same size and mtime
+        if not os.path.isfile(self.idxpath):
+            return False
+        size = len(IndexedTrace.IDX_MAGIC) + IndexedTrace.IDX_HEADER.size
+        with open(self.idxpath, "rb") as idxf:
+            data = idxf.read(size)
+        if len(data) < size or not data.startswith(IndexedTrace.IDX_MAGIC):
+            return False
+        version, byteorder, count, tsize, mtime = self.read_header(data)
+        return (
+            version == IndexedTrace.IDX_VERSION
+            and byteorder == (sys.byteorder == "big")
+            and (tsize, mtime) == self.stamp()
+            and os.path.getsize(self.idxpath) == size + 8 * count
+        )
+
+    def build_index(self):
+        # One pass over the trace, offsets written in blocks. Written to a
+        # temporary file and renamed, so readers never see a partial index.
+        stamp = self.stamp()
+        tmppath = f"{self.idxpath}.{os.getpid()}.tmp"
+        count = 0
+        block = array("q")
+        with open(self.filepath, "rb") as tf, open(tmppath, "wb") as idxf:
+            idxf.write(IndexedTrace.IDX_MAGIC)
+            idxf.write(IndexedTrace.IDX_HEADER.pack(0, 0, 0, 0, 0))
+            pos = 0
+            for line in tf:
+                # Blank and comment lines are not records, as in parse_chunk
+                text = line.split(b"#", 1)[0].strip()
+                if text:
+                    block.append(pos)
+                    if len(block) == 65536:
+                        count += len(block)
+                        block.tofile(idxf)
+                        block = array("q")
+                pos += len(line)
+            count += len(block)
+            block.tofile(idxf)
+            idxf.seek(len(IndexedTrace.IDX_MAGIC))
+            idxf.write(IndexedTrace.IDX_HEADER.pack(IndexedTrace.IDX_VERSION, sys.byteorder == "big", count, *stamp))
+        os.replace(tmppath, self.idxpath)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def decode(self, idx):
+        start = self.offsets[idx]
+        end = self.mm.find(b"\n", start)
+        line = self.mm[start : end if end >= 0 else len(self.mm)].decode()
+        if "#" in line:
+            line = line[: line.index("#")]
+        m = TRACE_RE.match(line.strip())
+        key = StaticInstruction.key(*m.group(1, 2, 3))
+        static = self.static_table.get(key)
+        if static is None:
+            static = self.static_table[key] = StaticInstruction.parse(*m.group(1, 2, 3))
+        return Instruction.view(static, Instruction.parse_value(m.group(4)), idx)
+
+    def Read(self, idx):
+        if idx >= len(self.offsets):
+            return HALT
+        cache = self.cache
+        ins = cache.get(idx)
+        if ins is not None:
+            cache.move_to_end(idx)
+            return ins
+        ins = self.decode(idx)
+        if self.cache_size > 0:
+            cache[idx] = ins
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return ins
+
+
+class TraceSlice(object):
+    # Instructions [start, end) of a trace, renumbered from 0 and followed by
+    # HALT, to time a region of the trace from an empty pipeline
+    def __init__(self, itrace, start, end):
+        self.itrace = itrace
+        self.start = start
+        self.end = min(end, len(itrace))
+
+    def __len__(self):
+        return max(self.end - self.start, 0)
+
+    def Read(self, idx):
+        if idx < self.end - self.start:
+            ins = self.itrace.Read(self.start + idx)
+            return Instruction.view(ins.static, ins.value, idx)
+        return HALT
+
+
+def parse_slice(text):
+    # "A:B" is [A, B), A or B can be left out for the start or end of the trace
+    start, sep, end = text.partition(":")
+    if not sep:
+        raise Exception(f"IndexedTrace - ERROR: Invalid slice, expected START:END: {text}")
+    return int(start) if start else 0, int(end) if end else sys.maxsize
+
+
+def open_trace(iodir, jobs=1, binary=False, indexed=False, bounds=None):
+    # Trace loaded by ITrace or read in place by IndexedTrace, sliced to
+    # [start, end) if bounds are given
+    if indexed:
+        itrace = IndexedTrace(iodir)
+    else:
+        itrace = ITrace(iodir, jobs=jobs, binary=binary)
+    if bounds is not None:
+        itrace = TraceSlice(itrace, *bounds)
+    return itrace
+
+
+if __name__ == "__main__":
+    # Build the index of a trace and print records by instruction number
+    parser = argparse.ArgumentParser(description="Indexed instruction trace")
+    parser.add_argument("--iodir", default="", type=str, help="Path to the folder containing the trace")
+    parser.add_argument("--name", default="trace", type=str, help="Trace file name without .txt")
+    parser.add_argument("--show", default=None, type=str, help="Print the records START:END")
+    args = parser.parse_args()
+
+    itrace = IndexedTrace(os.path.abspath(args.iodir), name=args.name)
+    print("Records:", len(itrace))
+    if args.show is not None:
+        start, end = parse_slice(args.show)
+        for idx in range(start, min(end, len(itrace))):
+            print(itrace.Read(idx))